@@ -0,0 +1,3 @@
+"""
+Shared ComfyUI orchestration for the generate_*.py scripts.
+"""
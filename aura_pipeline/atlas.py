@@ -0,0 +1,160 @@
+"""
+Sprite atlases for screens that show several levels at once.
+Each directory of lv0.png..lv4.png (one aura, or the mascot stages) is packed
+into a trimmed atlas.png next to them, so the level selector and the
+evolution overlay need one request and one decode instead of five. The grid
+atlas does the same for every aura's lv0 (the encyclopedia grid).
+atlas.json uses the TexturePacker "hash" layout: per frame the packed rect,
+where the trimmed rect sat in the original and the original size.
+
+    python -m aura_pipeline.atlas public/auras [--grid]
+"""
+
+import argparse
+import json
+import math
+import re
+from pathlib import Path
+
+from .encode import save_png
+from .fileio import atomic_write
+from .variants import write_variants
+
+LEVEL_FILE = re.compile(r'^lv(\d+)\.png$')
+ATLAS_NAME = "atlas"
+GRID_NAME = "lv0-atlas"
+# transparent gap between frames so filtering never bleeds a neighbour in
+PADDING = 2
+
+
+def trim(img):
+    """(trimmed RGBA image, (x, y) of the trimmed rect in the original)."""
+    img = img.convert('RGBA')
+    box = img.getchannel('A').getbbox() or (0, 0, 1, 1)
+    return img.crop(box), box[:2]
+
+
+def pack(sizes: dict, padding: int = PADDING) -> tuple:
+    """
+    Shelf-pack {name: (w, h)} tallest first into a roughly square sheet.
+    Returns ({name: (x, y)}, (sheet w, sheet h)).
+    """
+    area = sum((w + padding) * (h + padding) for w, h in sizes.values())
+    width = max(max(w for w, _ in sizes.values()) + padding, math.ceil(math.sqrt(area)))
+    positions = {}
+    x = y = shelf = 0
+    for name, (w, h) in sorted(sizes.items(), key=lambda kv: -kv[1][1]):
+        if x and x + w > width:
+            x, y, shelf = 0, y + shelf + padding, 0
+        positions[name] = (x, y)
+        x += w + padding
+        shelf = max(shelf, h)
+    used_w = max(px + sizes[n][0] for n, (px, _) in positions.items())
+    return positions, (used_w, y + shelf)
+
+
+def build_atlas(frames: dict, out_dir: Path, name: str = ATLAS_NAME, variants: bool = False,
+                encoding: dict = None) -> dict:
+    """
+    Pack {frame name: image path} into <out_dir>/<name>.png and <name>.json.
+    With `variants`, WebP/AVIF copies of the sheet are listed under meta.variants.
+    Returns the coordinate map.
+    """
+    from PIL import Image
+    trimmed = {}
+    for frame, path in frames.items():
+        with Image.open(path) as img:
+            crop, offset = trim(img)
+            trimmed[frame] = (crop, offset, img.size)
+    positions, (width, height) = pack({f: crop.size for f, (crop, _, _) in trimmed.items()})
+
+    sheet = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    coords = {}
+    for frame, (crop, (ox, oy), (sw, sh)) in trimmed.items():
+        x, y = positions[frame]
+        sheet.paste(crop, (x, y))
+        coords[frame] = {
+            'frame': {'x': x, 'y': y, 'w': crop.width, 'h': crop.height},
+            'trimmed': (crop.width, crop.height) != (sw, sh),
+            'spriteSourceSize': {'x': ox, 'y': oy, 'w': crop.width, 'h': crop.height},
+            'sourceSize': {'w': sw, 'h': sh},
+        }
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    image_path = out_dir / f"{name}.png"
+    save_png(sheet, image_path, **(encoding or {}))
+    data = {
+        'frames': dict(sorted(coords.items())),
+        'meta': {'image': image_path.name, 'size': {'w': width, 'h': height}, 'format': 'RGBA8888'},
+    }
+    if variants:
+        entries = write_variants(sheet, image_path, sizes=(), encoding=encoding)
+        data['meta']['variants'] = sorted(entries, key=lambda e: e['bytes'])
+    atomic_write(out_dir / f"{name}.json", json.dumps(data, indent=1).encode('utf-8'))
+    return data
+
+
+def level_frames(directory: Path) -> dict:
+    """{'lv0': path, ...} for the lvN.png files directly in `directory`."""
+    frames = {}
+    for path in directory.iterdir():
+        match = LEVEL_FILE.match(path.name)
+        if match:
+            frames[f"lv{match.group(1)}"] = path
+    return dict(sorted(frames.items()))
+
+
+def grid_frames(root: Path) -> dict:
+    """{'<aura id>': <root>/<id>/lv0.png} for every aura directory under `root`."""
+    dirs = sorted(root.iterdir(), key=lambda d: (not d.name.isdigit(), int(d.name) if d.name.isdigit() else 0, d.name))
+    return {d.name: d / "lv0.png" for d in dirs if d.is_dir() and (d / "lv0.png").exists()}
+
+
+def build_level_atlases(directories, grid_roots=(), variants: bool = False, encoding: dict = None) -> list:
+    """Rebuild the per-directory level atlases and lv0 grids; returns the atlas image paths."""
+    written = []
+    for directory in sorted(set(directories)):
+        frames = level_frames(directory)
+        if len(frames) > 1:
+            build_atlas(frames, directory, variants=variants, encoding=encoding)
+            written.append(directory / f"{ATLAS_NAME}.png")
+    for root in sorted(set(grid_roots)):
+        frames = grid_frames(root)
+        if len(frames) > 1:
+            build_atlas(frames, root, GRID_NAME, variants=variants, encoding=encoding)
+            written.append(root / f"{GRID_NAME}.png")
+    return written
+
+
+def stale_atlases(jobs: list, changed: set, grid: bool = False) -> tuple:
+    """
+    The level directories among `jobs` outputs whose atlas is missing or
+    has a frame in `changed` (output paths rewritten this run), and with
+    `grid`, the aura roots whose lv0 grid needs the same.
+    """
+    directories, roots = set(), set()
+    for job in jobs:
+        if not LEVEL_FILE.match(job.dst.name):
+            continue
+        directory = job.dst.parent
+        if job.dst in changed or not (directory / f"{ATLAS_NAME}.png").exists():
+            directories.add(directory)
+        if grid and directory.name.isdigit() and job.dst.name == "lv0.png":
+            if job.dst in changed or not (directory.parent / f"{GRID_NAME}.png").exists():
+                roots.add(directory.parent)
+    return directories, roots
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack existing lvN.png files into sprite atlases.")
+    parser.add_argument('root', type=Path, help="e.g. public/auras (every subdirectory is one aura)")
+    parser.add_argument('--grid', action='store_true', help="also pack every aura's lv0 into one grid atlas")
+    args = parser.parse_args()
+
+    directories = [d for d in args.root.iterdir() if d.is_dir()] + [args.root]
+    for path in build_level_atlases(directories, [args.root] if args.grid else []):
+        print(f"{path} ({path.stat().st_size / 1024:.0f}KB)")
+
+
+if __name__ == '__main__':
+    main()
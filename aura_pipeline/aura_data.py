@@ -0,0 +1,84 @@
+"""
+Aura prompt data, read from the app's own source of truth.
+src/data/aura-types.ts defines every aura (id, name, fluxPrompt, ...) for
+the React app; the generators read the same records instead of keeping a
+hand-copied dict, so a prompt fix in the app is what the next run renders.
+A small tokenizer picks the scalar fields out of the object literals in the
+exported array, no Node toolchain needed. The records can also be exported
+to, and loaded from, a plain JSON file:
+
+    python -m aura_pipeline.aura_data [src/data/aura-types.ts] -o aura-types.json
+"""
+
+import argparse
+import ast
+import json
+import re
+from pathlib import Path
+
+AURA_TYPES = Path(__file__).resolve().parent.parent / "src" / "data" / "aura-types.ts"
+
+_TOKEN = re.compile(r"""
+    (?P<str>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+  | (?P<key>[A-Za-z_$][\w$]*)\s*:(?!:)
+  | (?P<num>-?\d+(?:\.\d+)?)
+  | (?P<open>[{\[])
+  | (?P<close>[}\]])
+  | //[^\n]*
+  | /\*.*?\*/
+""", re.S | re.X)
+
+
+def parse_records(text: str) -> list:
+    """Scalar (string/number) fields of every object literal directly inside an array."""
+    records = []
+    stack = []
+    record = key = None
+    for match in _TOKEN.finditer(text):
+        kind = match.lastgroup
+        if kind == 'open':
+            stack.append(match.group())
+            if stack[-2:] == ['[', '{']:
+                record, key = {}, None
+            else:
+                key = None
+        elif kind == 'close':
+            if stack[-2:] == ['[', '{'] and record is not None:
+                records.append(record)
+                record = None
+            if stack:
+                stack.pop()
+        elif record is not None and stack[-2:] == ['[', '{']:
+            if kind == 'key':
+                key = match.group('key')
+            elif kind in ('str', 'num') and key:
+                value = match.group(kind)
+                record[key] = ast.literal_eval(value) if kind == 'str' else json.loads(value)
+                key = None
+    return records
+
+
+def load_auras(path: Path = AURA_TYPES) -> dict:
+    """{aura id: record} from aura-types.ts or an exported JSON list."""
+    path = Path(path)
+    text = path.read_text(encoding='utf-8')
+    records = json.loads(text) if path.suffix == '.json' else parse_records(text)
+    return {int(r['id']): r for r in records if 'id' in r}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the aura records the generators use as JSON.")
+    parser.add_argument('source', nargs='?', type=Path, default=AURA_TYPES)
+    parser.add_argument('-o', '--output', type=Path, help="write here instead of stdout")
+    args = parser.parse_args()
+
+    text = json.dumps(list(load_auras(args.source).values()), ensure_ascii=False, indent=1)
+    if args.output:
+        args.output.write_text(text + '\n', encoding='utf-8')
+        print(f"Wrote {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
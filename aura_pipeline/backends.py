@@ -0,0 +1,152 @@
+"""
+A pool of ComfyUI servers sharing one job stream.
+Each backend keeps its own window of prompts; new jobs go to the live backend
+with the shortest expected wait (its /queue depth times its observed seconds
+per image), so a faster GPU box simply takes more of the run. A backend that
+stops answering is dropped and its in-flight jobs are handed back for
+re-submission elsewhere.
+"""
+
+import threading
+import time
+
+from .comfy_http import client
+from .comfy_ws import CompletionTracker
+
+# Poll /queue at most this often for backends without a live WebSocket
+QUEUE_REFRESH = 2.0
+# Smoothing for the per-image time estimate (weight of the newest sample)
+EWMA_ALPHA = 0.3
+# Assumed seconds per image before a backend has finished anything
+DEFAULT_IMAGE_SECONDS = 10.0
+
+
+def queue_depth(url: str, timeout: float = 5.0) -> int:
+    """Running plus pending prompts on a server, from GET /queue."""
+    queue = client.get_json(f"{url}/queue", timeout)
+    return len(queue.get('queue_running', [])) + len(queue.get('queue_pending', []))
+
+
+class Backend:
+    """One ComfyUI server: its event tracker, our prompts on it and its speed."""
+
+    def __init__(self, url: str, tracker: CompletionTracker = None):
+        self.url = url
+        self.tracker = tracker
+        self.in_flight = {}  # prompt_id -> engine.JobResult
+        # re-attached prompts queued by an earlier client: no events, always polled
+        self.orphans = set()
+        self.alive = True
+        self.image_seconds = None
+        self.completed = 0
+        self._queue = 0
+        self._queue_at = 0.0
+        self._last_full_check = 0.0
+
+    @property
+    def client_id(self) -> str:
+        return self.tracker.client_id if self.tracker is not None else None
+
+    @property
+    def live(self) -> bool:
+        return self.tracker is not None and self.tracker.connected
+
+    def queue_size(self) -> int:
+        """Server-wide queue length (other clients' prompts included), never below our own."""
+        if self.live and self.tracker.queue_remaining is not None:
+            self._queue = self.tracker.queue_remaining
+        elif time.time() - self._queue_at > QUEUE_REFRESH:
+            self._queue_at = time.time()
+            try:
+                self._queue = queue_depth(self.url)
+            except Exception:
+                pass
+        return max(self._queue, len(self.in_flight))
+
+    def observe(self, seconds: float):
+        """Fold one finished image's execution time into the speed estimate."""
+        self.completed += 1
+        if self.image_seconds is None:
+            self.image_seconds = seconds
+        else:
+            self.image_seconds += EWMA_ALPHA * (seconds - self.image_seconds)
+
+    def due_for_check(self, recheck_interval: float) -> bool:
+        """Whether every in-flight prompt should be checked against /history now."""
+        if not self.live or time.time() - self._last_full_check >= recheck_interval:
+            self._last_full_check = time.time()
+            return True
+        return False
+
+
+class BackendPool:
+    """Schedules prompts over several backends and waits on all of their events."""
+
+    def __init__(self, urls: list, use_ws: bool = True):
+        # one condition for every tracker, so a single wait covers the whole pool
+        self._cond = threading.Condition()
+        self.backends = []
+        for url in dict.fromkeys(urls):
+            tracker = CompletionTracker.connect(url, cond=self._cond) if use_ws else None
+            self.backends.append(Backend(url, tracker))
+
+    def get(self, url: str) -> Backend:
+        return next((b for b in self.backends if b.url == url), None)
+
+    @property
+    def alive(self) -> list:
+        return [b for b in self.backends if b.alive]
+
+    @property
+    def busy(self) -> bool:
+        return any(b.in_flight for b in self.backends)
+
+    def _image_seconds(self, backend: Backend) -> float:
+        if backend.image_seconds is not None:
+            return backend.image_seconds
+        known = [b.image_seconds for b in self.backends if b.image_seconds is not None]
+        return sum(known) / len(known) if known else DEFAULT_IMAGE_SECONDS
+
+    def expected_wait(self, backend: Backend) -> float:
+        """Seconds until a prompt queued now would finish on `backend`."""
+        return (backend.queue_size() + 1) * self._image_seconds(backend)
+
+    def pick(self, window: int) -> Backend:
+        """The least-loaded live backend with room in its window, or None."""
+        open_ = [b for b in self.alive if len(b.in_flight) < window]
+        if not open_:
+            return None
+        return min(open_, key=self.expected_wait)
+
+    def wait(self, timeout: float) -> set:
+        """
+        Block until a tracked prompt finishes or `timeout` passes (which is
+        also the poll interval for backends without a WebSocket). Returns
+        the prompt_ids the WebSocket events report as finished.
+        """
+        deadline = time.time() + timeout
+        with self._cond:
+            while True:
+                ready = {pid for b in self.alive if b.live for pid in b.in_flight
+                         if (rec := b.tracker.records.get(pid)) is not None and rec.finished}
+                remaining = deadline - time.time()
+                if ready or remaining <= 0:
+                    return ready
+                self._cond.wait(remaining)
+
+    def drop(self, backend: Backend) -> list:
+        """Mark `backend` dead and return the jobs that were in flight on it."""
+        backend.alive = False
+        jobs = [result.job for result in backend.in_flight.values()]
+        backend.in_flight.clear()
+        backend.orphans.clear()
+        if backend.tracker is not None:
+            backend.tracker.close()
+            backend.tracker = None
+        print(f"ComfyUI backend {backend.url} unreachable, re-routing {len(jobs)} job(s)")
+        return jobs
+
+    def close(self):
+        for backend in self.backends:
+            if backend.tracker is not None:
+                backend.tracker.close()
@@ -0,0 +1,164 @@
+"""
+Content-addressed generation cache.
+Jobs are keyed by a hash of their canonicalised ComfyUI workflow (prompts,
+seed, steps, model names, resolution), so editing a prompt or seed
+regenerates exactly the affected images. Both the raw ComfyUI output and the
+post-processed PNG are kept:
+
+    .gen_cache/raw/<workflow-hash>.png   (+ <hash>-<i>.png for batch candidates)
+    .gen_cache/out/<output-hash>.png     (workflow hash + output size + post-processing params)
+    .gen_cache/index.json                {dst path: {"key": ..., "out": ..., "pick": ...}}
+"""
+
+import copy
+import hashlib
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .fileio import atomic_copy, atomic_write
+
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent.parent / ".gen_cache"
+
+# Inputs that name or route the output but do not change the pixels
+IGNORED_INPUTS = {'filename_prefix'}
+
+
+def canonical_workflow(workflow: dict) -> dict:
+    graph = copy.deepcopy(workflow.get('prompt', workflow))
+    for node in graph.values():
+        inputs = node.get('inputs', {})
+        for name in IGNORED_INPUTS & inputs.keys():
+            del inputs[name]
+    return graph
+
+
+def workflow_key(workflow: dict) -> str:
+    text = json.dumps(canonical_workflow(workflow), sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:32]
+
+
+@dataclass
+class CachePlan:
+    """How each job will be satisfied on this run."""
+    fresh: list = field(default_factory=list)     # dst already matches the inputs
+    restore: list = field(default_factory=list)   # copy the cached result to dst
+    raw: list = field(default_factory=list)       # re-run post-processing only
+    generate: list = field(default_factory=list)  # needs ComfyUI
+    # jobs whose workflow (prompt, seed, ...) differs from the last run that wrote dst
+    changed: list = field(default_factory=list)
+
+
+class GenerationCache:
+    def __init__(self, root: Path = None, enabled: bool = True, **post_params):
+        self.root = Path(root or DEFAULT_CACHE_DIR)
+        self.enabled = enabled
+        self.post_params = post_params
+        self.index_path = self.root / "index.json"
+        try:
+            self.index = json.loads(self.index_path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            self.index = {}
+        # index entries recorded since the last flush()
+        self._dirty = False
+
+    def post_signature(self, job) -> str:
+        """The post-processing settings a job's output depends on, as a string."""
+        return json.dumps(dict(self.post_params, size=list(job.size)), sort_keys=True)
+
+    def _keys(self, job) -> tuple:
+        if 'cache_key' not in job.meta:
+            key = workflow_key(job.workflow)
+            params = self.post_signature(job)
+            job.meta['cache_key'] = key
+            job.meta['cache_out'] = hashlib.sha256(f"{key}:{params}".encode()).hexdigest()[:32]
+        return job.meta['cache_key'], job.meta['cache_out']
+
+    def _raw_path(self, key: str) -> Path:
+        return self.root / "raw" / f"{key}.png"
+
+    def _out_path(self, out: str) -> Path:
+        return self.root / "out" / f"{out}.png"
+
+    def flush(self):
+        """Write index.json if anything was recorded since the last flush."""
+        if not self._dirty:
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        atomic_write(self.index_path, json.dumps(self.index, indent=1, sort_keys=True).encode('utf-8'))
+        self._dirty = False
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def plan(self, jobs, track: bool = True) -> CachePlan:
+        """Sort `jobs` by how they can be satisfied; `track=False` (dry runs) leaves the index untouched."""
+        plan = CachePlan()
+        for job in jobs:
+            key, out = self._keys(job)
+            if not self.enabled:
+                plan.generate.append(job)
+                continue
+            entry = self.index.get(str(job.dst))
+            if entry is not None and entry.get('key') != key:
+                plan.changed.append(job)
+            if job.dst.exists() and entry is None:
+                # pre-cache output: assume it is current and start tracking it
+                if track:
+                    self.store_output(job)
+                plan.fresh.append(job)
+            elif job.dst.exists() and entry.get('key') == key and entry.get('out') == out:
+                plan.fresh.append(job)
+            elif self._out_path(out).exists():
+                plan.restore.append(job)
+            elif self._raw_path(key).exists():
+                plan.raw.append(job)
+            else:
+                plan.generate.append(job)
+        return plan
+
+    def restore(self, job):
+        _, out = self._keys(job)
+        job.dst.parent.mkdir(parents=True, exist_ok=True)
+        atomic_copy(self._out_path(out), job.dst)
+        self._record(job)
+
+    def load_raw(self, job) -> list:
+        key, _ = self._keys(job)
+        images = [self._raw_path(key).read_bytes()]
+        extra = 1
+        while self._raw_path(f"{key}-{extra}").exists():
+            images.append(self._raw_path(f"{key}-{extra}").read_bytes())
+            extra += 1
+        return images
+
+    def store_raw(self, job, images: list):
+        key, _ = self._keys(job)
+        for i, data in enumerate(images):
+            path = self._raw_path(key if i == 0 else f"{key}-{i}")
+            path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write(path, data)
+
+    def store_output(self, job, **extra):
+        """Cache the post-processed dst; `extra` (e.g. the winning candidate) goes in the index."""
+        _, out = self._keys(job)
+        path = self._out_path(out)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_copy(job.dst, path)
+        self._record(job, **extra)
+
+    def _record(self, job, **extra):
+        key, out = self._keys(job)
+        entry = self.index.get(str(job.dst), {})
+        if entry.get('out') != out:
+            entry = {}
+        entry.update(extra, key=key, out=out)
+        self.index[str(job.dst)] = entry
+        # written once at close(), not per image
+        self._dirty = True
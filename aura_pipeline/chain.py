@@ -0,0 +1,72 @@
+"""
+img2img evolution chains.
+Level jobs that share a Job.chain id (built with workflow.chain_workflows)
+are submitted as one ComfyUI prompt, so each level's latent feeds the next
+sampler on the GPU without a decode/encode round-trip, while independent
+chains still fill the pipeline window side by side. Only the levels the
+cache says are missing are merged in; their graphs already contain the
+upstream samplers they need. The finished prompt is split back into one
+JobResult per level before caching and post-processing.
+"""
+
+import dataclasses
+
+from .engine import Job, JobResult, find_output_images
+from .workflow import merge_workflows
+
+
+def chain_jobs(jobs: list) -> list:
+    """`jobs` with every chain replaced by one merged Job, at its first level's position."""
+    groups = {}
+    for job in jobs:
+        groups.setdefault(job.chain or id(job), []).append(job)
+    merged = []
+    for levels in groups.values():
+        if len(levels) == 1:
+            merged.append(levels[0])
+            continue
+        first, last = levels[0], levels[-1]
+        merged.append(Job(key=f"{first.chain}:{first.key}..{last.key}",
+                          label=f"{first.label} .. {last.label} (chain)",
+                          workflow=merge_workflows([job.workflow for job in levels]),
+                          dst=last.dst, size=last.size, timeout=sum(job.timeout for job in levels),
+                          chain=first.chain, aura=first.aura, level=first.level, meta={'levels': levels}))
+    return merged
+
+
+def _owned_nodes(levels: list) -> list:
+    """For each level, the node ids no earlier level's graph already has."""
+    seen, owned = set(), []
+    for job in levels:
+        nodes = set(job.workflow['prompt']) - seen
+        seen |= nodes
+        owned.append(nodes)
+    return owned
+
+
+def split_result(result: JobResult) -> list:
+    """One JobResult per level of a merged chain job; other results are returned as they are."""
+    levels = result.job.meta.get('levels')
+    if not levels:
+        return [result]
+    by_name = {}
+    if result.images:
+        refs = find_output_images(result.history)
+        by_name = {ref['filename']: data for ref, data in zip(refs, result.images)}
+    split = []
+    for job, owned in zip(levels, _owned_nodes(levels)):
+        level = dataclasses.replace(result, job=job, images=None)
+        if result.events is not None:
+            # per-node timings of this level only, so stage totals are not counted twice
+            level.events = dataclasses.replace(
+                result.events,
+                node_seconds={n: s for n, s in result.events.node_seconds.items() if n in owned},
+                cached_nodes=[n for n in result.events.cached_nodes if n in owned])
+        if result.ok:
+            saves = {n for n, node in job.workflow['prompt'].items() if node['class_type'] == 'SaveImage'}
+            level.images = [by_name[ref['filename']] for ref in find_output_images(result.history, saves)
+                            if ref['filename'] in by_name]
+            if not level.images:
+                level.error = 'output'
+        split.append(level)
+    return split
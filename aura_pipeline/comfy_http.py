@@ -0,0 +1,138 @@
+"""
+Keep-alive HTTP client for the ComfyUI REST API.
+urllib opens a new TCP connection per call and waits forever by default; a
+polling run made hundreds of them. HTTPClient keeps idle http.client
+connections per server and hands them to whichever thread asks next, gives
+every request a timeout, and counts connections and requests so the
+per-request overhead of a run can be measured.
+"""
+
+import http.client
+import json
+import threading
+import time
+import urllib.parse
+
+DEFAULT_TIMEOUT = 30.0
+# Idle connections kept per server; enough for the engine plus a few probes
+MAX_IDLE = 8
+
+# Raised when a reused keep-alive connection turns out to be closed by the
+# server; the request is retried once on a fresh connection
+_STALE = (ConnectionResetError, ConnectionAbortedError, BrokenPipeError, http.client.BadStatusLine)
+
+
+class HTTPError(Exception):
+    """The server answered with a non-2xx status."""
+
+    def __init__(self, url: str, status: int, reason: str, body: bytes):
+        super().__init__(f"HTTP {status} {reason}")
+        self.url = url
+        self.status = status
+        self.body = body
+
+
+class HTTPClient:
+    """Thread-safe pool of keep-alive connections, keyed by scheme and host."""
+
+    def __init__(self, timeout: float = DEFAULT_TIMEOUT, max_idle: int = MAX_IDLE):
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._idle = {}  # (scheme, netloc) -> [HTTPConnection]
+        self._lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.reused = 0
+        self.errors = 0
+        self.seconds = 0.0
+
+    def _acquire(self, key: tuple, timeout: float) -> tuple:
+        with self._lock:
+            idle = self._idle.get(key)
+            conn = idle.pop() if idle else None
+            if conn is None:
+                self.connections += 1
+        if conn is None:
+            scheme, netloc = key
+            cls = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+            return cls(netloc, timeout=timeout), False
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn, True
+
+    def _release(self, key: tuple, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def request(self, method: str, url: str, body: bytes = None, headers: dict = None,
+                timeout: float = None) -> bytes:
+        """Send one request and return the response body; raises HTTPError on non-2xx."""
+        parts = urllib.parse.urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        target = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+        timeout = self.timeout if timeout is None else timeout
+        start = time.perf_counter()
+        while True:
+            conn, reused = self._acquire(key, timeout)
+            try:
+                conn.request(method, target, body=body, headers=headers or {})
+                resp = conn.getresponse()
+                data = resp.read()
+                break
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                if reused and isinstance(e, _STALE):
+                    continue
+                with self._lock:
+                    self.errors += 1
+                if isinstance(e, OSError):
+                    raise
+                raise ConnectionError(f"{url}: {e!r}") from e
+
+        with self._lock:
+            self.requests += 1
+            self.reused += reused
+            self.seconds += time.perf_counter() - start
+        if resp.will_close:
+            conn.close()
+        else:
+            self._release(key, conn)
+        if not 200 <= resp.status < 300:
+            raise HTTPError(url, resp.status, resp.reason, data)
+        return data
+
+    def get(self, url: str, timeout: float = None) -> bytes:
+        return self.request('GET', url, timeout=timeout)
+
+    def get_json(self, url: str, timeout: float = None):
+        return json.loads(self.get(url, timeout))
+
+    def post_json(self, url: str, obj, timeout: float = None):
+        body = json.dumps(obj).encode('utf-8')
+        data = self.request('POST', url, body, {'Content-Type': 'application/json'}, timeout)
+        return json.loads(data) if data else None
+
+    def stats(self, since: dict = None) -> dict:
+        """Counters so far, or the difference from an earlier stats() snapshot."""
+        with self._lock:
+            now = {'connections': self.connections, 'requests': self.requests,
+                   'reused': self.reused, 'errors': self.errors, 'seconds': self.seconds}
+        if since:
+            now = {k: v - since.get(k, 0) for k, v in now.items()}
+        return now
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+
+# The process-wide client every ComfyUI call goes through
+client = HTTPClient()
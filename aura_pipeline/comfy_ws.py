@@ -0,0 +1,276 @@
+"""
+Event-driven completion tracking over the ComfyUI /ws endpoint.
+One WebSocket per run receives execution events for every prompt queued with
+our client_id, so the engine learns about finished jobs immediately instead of
+polling /history. Uses a minimal stdlib WebSocket client (text frames only;
+binary preview frames are discarded).
+"""
+
+import base64
+import hashlib
+import json
+import os
+import socket
+import ssl
+import threading
+import time
+import urllib.parse
+import uuid
+from dataclasses import dataclass, field
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+class WebSocketError(Exception):
+    pass
+
+
+class WebSocketClient:
+    """Just enough of RFC 6455 to read ComfyUI's event stream."""
+
+    def __init__(self, url: str, timeout: float = 10):
+        parts = urllib.parse.urlsplit(url)
+        secure = parts.scheme in ('wss', 'https')
+        host = parts.hostname
+        port = parts.port or (443 if secure else 80)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        sock = socket.create_connection((host, port), timeout=timeout)
+        if secure:
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=host)
+        self.sock = sock
+        self._send_lock = threading.Lock()
+
+        key = base64.b64encode(os.urandom(16)).decode()
+        request = (
+            f"GET {path} HTTP/1.1\r\n"
+            f"Host: {host}:{port}\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\n"
+            "Sec-WebSocket-Version: 13\r\n\r\n"
+        )
+        sock.sendall(request.encode('ascii'))
+        self._rfile = sock.makefile('rb')
+
+        status = self._rfile.readline().decode('latin-1')
+        if ' 101 ' not in status:
+            raise WebSocketError(f"handshake failed: {status.strip()}")
+        headers = {}
+        while True:
+            line = self._rfile.readline().decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        expected = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        if headers.get('sec-websocket-accept') != expected:
+            raise WebSocketError("handshake failed: bad Sec-WebSocket-Accept")
+        sock.settimeout(None)
+
+    def _read_exact(self, n: int) -> bytes:
+        data = self._rfile.read(n)
+        if data is None or len(data) < n:
+            raise WebSocketError("connection closed")
+        return data
+
+    def _read_frame(self):
+        b1, b2 = self._read_exact(2)
+        fin, opcode = b1 & 0x80, b1 & 0x0F
+        length = b2 & 0x7F
+        if length == 126:
+            length = int.from_bytes(self._read_exact(2), 'big')
+        elif length == 127:
+            length = int.from_bytes(self._read_exact(8), 'big')
+        mask = self._read_exact(4) if b2 & 0x80 else None
+        payload = self._read_exact(length) if length else b''
+        if mask:
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        return bool(fin), opcode, payload
+
+    def send_frame(self, opcode: int, payload: bytes = b''):
+        header = bytearray([0x80 | opcode])
+        length = len(payload)
+        if length < 126:
+            header.append(0x80 | length)
+        elif length < 1 << 16:
+            header.append(0x80 | 126)
+            header += length.to_bytes(2, 'big')
+        else:
+            header.append(0x80 | 127)
+            header += length.to_bytes(8, 'big')
+        mask = os.urandom(4)
+        header += mask
+        masked = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        with self._send_lock:
+            self.sock.sendall(bytes(header) + masked)
+
+    def recv(self):
+        """Return the next text message, or None once the server closes."""
+        message, message_op = b'', None
+        while True:
+            fin, opcode, payload = self._read_frame()
+            if opcode == 0x8:
+                return None
+            if opcode == 0x9:
+                self.send_frame(0xA, payload)
+                continue
+            if opcode == 0xA:
+                continue
+            if opcode != 0x0:
+                message, message_op = b'', opcode
+            message += payload
+            if fin:
+                if message_op == 0x1:
+                    return message.decode('utf-8')
+                message, message_op = b'', None
+
+    def close(self):
+        try:
+            self.send_frame(0x8)
+        except OSError:
+            pass
+        try:
+            # shutdown() also unblocks a reader thread sitting in recv()
+            self.sock.shutdown(socket.SHUT_RDWR)
+            self.sock.close()
+        except OSError:
+            pass
+
+
+@dataclass
+class PromptRecord:
+    """What the event stream has told us about one prompt."""
+    prompt_id: str
+    # 'queued' -> 'running' -> 'done' | 'error' | 'interrupted'
+    state: str = 'queued'
+    started_at: float = 0.0
+    finished_at: float = 0.0
+    current_node: str = None
+    progress: tuple = (0, 0)
+    cached_nodes: list = field(default_factory=list)
+    node_started: dict = field(default_factory=dict)
+    node_seconds: dict = field(default_factory=dict)
+    outputs: dict = field(default_factory=dict)
+    # terminal state reported before the final executing(node=None) event
+    outcome: str = ''
+    error: str = ''
+
+    @property
+    def finished(self) -> bool:
+        return self.state in ('done', 'error', 'interrupted')
+
+
+class CompletionTracker:
+    """
+    Background reader for one /ws?clientId=... connection.
+    Records events for every prompt_id it sees, so there is no race between
+    queueing a prompt and it finishing before we start waiting on it.
+    """
+
+    def __init__(self, base_url: str, client_id: str = None, cond: threading.Condition = None):
+        self.client_id = client_id or uuid.uuid4().hex
+        ws_url = base_url.replace('http://', 'ws://').replace('https://', 'wss://')
+        self.ws = WebSocketClient(f"{ws_url}/ws?clientId={self.client_id}")
+        self.connected = True
+        self.records = {}
+        self.queue_remaining = None
+        # trackers of a backend pool share one condition to wait on together
+        self._cond = cond or threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='comfy-ws', daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def connect(cls, base_url: str, cond: threading.Condition = None):
+        """Open a tracker, or return None if the server has no usable /ws."""
+        try:
+            return cls(base_url, cond=cond)
+        except (OSError, WebSocketError) as e:
+            print(f"WebSocket unavailable ({e}), polling /history instead")
+            return None
+
+    def _record(self, prompt_id: str) -> PromptRecord:
+        rec = self.records.get(prompt_id)
+        if rec is None:
+            rec = self.records[prompt_id] = PromptRecord(prompt_id)
+        return rec
+
+    def _finish_node(self, rec: PromptRecord, now: float):
+        node = rec.current_node
+        if node is not None and node in rec.node_started:
+            rec.node_seconds[node] = now - rec.node_started[node]
+        rec.current_node = None
+
+    def _handle(self, msg: dict):
+        kind, data = msg.get('type'), msg.get('data') or {}
+        if kind == 'status':
+            info = data.get('status', {}).get('exec_info', {})
+            self.queue_remaining = info.get('queue_remaining', self.queue_remaining)
+            return
+        prompt_id = data.get('prompt_id')
+        if not prompt_id:
+            return
+        now = time.time()
+        rec = self._record(prompt_id)
+
+        if kind == 'execution_start':
+            rec.state, rec.started_at = 'running', now
+        elif kind == 'execution_cached':
+            rec.cached_nodes = list(data.get('nodes', []))
+        elif kind == 'executing':
+            self._finish_node(rec, now)
+            node = data.get('node')
+            if node is None:
+                # executing(node=None) is sent after ComfyUI has written the
+                # /history entry, so only this event marks the prompt finished
+                if not rec.finished:
+                    rec.state, rec.finished_at = rec.outcome or 'done', now
+            else:
+                if rec.state == 'queued':
+                    rec.state, rec.started_at = 'running', now
+                rec.current_node = node
+                rec.node_started[node] = now
+                rec.progress = (0, 0)
+        elif kind == 'progress':
+            rec.progress = (data.get('value', 0), data.get('max', 0))
+        elif kind == 'executed':
+            rec.outputs[data.get('node')] = data.get('output') or {}
+        elif kind == 'execution_success':
+            self._finish_node(rec, now)
+        elif kind == 'execution_error':
+            self._finish_node(rec, now)
+            rec.outcome = 'error'
+            rec.error = data.get('exception_message', '') or json.dumps(data)[:500]
+        elif kind == 'execution_interrupted':
+            self._finish_node(rec, now)
+            rec.outcome = 'interrupted'
+
+    def _run(self):
+        try:
+            while True:
+                text = self.ws.recv()
+                if text is None:
+                    break
+                try:
+                    msg = json.loads(text)
+                except ValueError:
+                    continue
+                with self._cond:
+                    self._handle(msg)
+                    self._cond.notify_all()
+        except (OSError, WebSocketError):
+            pass
+        finally:
+            with self._cond:
+                self.connected = False
+                self._cond.notify_all()
+
+    def get(self, prompt_id: str) -> PromptRecord:
+        with self._cond:
+            return self.records.get(prompt_id)
+
+    def close(self):
+        self.ws.close()
+        self._thread.join(timeout=2)
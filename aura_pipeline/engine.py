@@ -0,0 +1,546 @@
+"""
+Pipelined ComfyUI job engine.
+Keeps up to `window` prompts queued on each ComfyUI server at once (see
+backends.py for spreading a run over several) and yields results in
+completion order, so the GPU keeps sampling while the caller post-processes
+the previous image. Outputs are streamed from /view into memory, so the
+generator does not need access to the ComfyUI output directory.
+A prompt we give up on (timeout, Ctrl-C) is taken off the server again, by
+/interrupt if it is running or a /queue delete if it is not, so the GPU
+does not keep rendering images nobody will collect; failed jobs are retried
+a bounded number of times with jittered exponential backoff.
+"""
+
+import copy
+import urllib.parse
+import json
+import random
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .backends import BackendPool
+from .comfy_http import HTTPError, client
+from .encode import DEFAULT_ENCODER, ENCODERS
+from .matting import DEFAULT_MATTING, MATTING_MODES
+from .postprocess import DEFAULT_MATTING_MODEL, DEFAULT_WORKERS, MATTING_MODELS
+from .priority import DEFAULT_PRIORITY, PRIORITY_ORDERS
+
+COMFYUI_URL = "http://127.0.0.1:8188"
+
+DEFAULT_WINDOW = 4
+POLL_INTERVAL = 1.0
+# With a live WebSocket, /history is only re-checked this often as a safety net
+WS_RECHECK_INTERVAL = 15.0
+# Liveness probe for a backend that stopped answering /history
+PROBE_TIMEOUT = 5.0
+
+DEFAULT_RETRIES = 1
+# Attempt n waits RETRY_BACKOFF * 2^(n-1) seconds, +-RETRY_JITTER of that
+RETRY_BACKOFF = 2.0
+RETRY_JITTER = 0.5
+# Failures worth another attempt; 'queue' means ComfyUI rejected the workflow itself
+RETRYABLE = ('timeout', 'error', 'output', 'fetch')
+# Added to every KSampler seed per attempt with --reseed
+RESEED_STRIDE = 1_000_003
+
+
+@dataclass
+class Job:
+    """One image to generate: a ComfyUI workflow plus where its output goes."""
+    key: str
+    label: str
+    workflow: dict
+    dst: Path
+    size: tuple = (512, 512)
+    timeout: int = 300
+    # jobs sharing a chain id are rendered together as one img2img prompt (see chain.py)
+    chain: str = ''
+    # which app asset this is (aura id, evolution level), for run priorities
+    aura: int = None
+    level: int = None
+    meta: dict = field(default_factory=dict)
+
+
+@dataclass
+class JobResult:
+    job: Job
+    prompt_id: str = ''
+    # URL of the ComfyUI server the prompt ran on
+    backend: str = ''
+    history: dict = None
+    # raw PNG bytes of every output image (one per batch candidate), from /view
+    images: list = None
+    # '' on success, otherwise one of 'queue', 'timeout', 'error', 'output', 'fetch', 'cancelled'
+    error: str = ''
+    detail: str = ''
+    submitted_at: float = 0.0
+    finished_at: float = 0.0
+    download_seconds: float = 0.0
+    # PromptRecord from the WebSocket tracker (per-node timings), if one ran
+    events: object = None
+    # GPU time spent on attempts of this job that were interrupted, earlier retries included
+    zombie_seconds: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return not self.error
+
+    @property
+    def image(self) -> bytes:
+        return self.images[0] if self.images else None
+
+    @property
+    def queue_seconds(self) -> float:
+        """Time spent waiting on the ComfyUI queue before execution started."""
+        if self.events is None or not self.events.started_at:
+            return 0.0
+        return max(0.0, self.events.started_at - self.submitted_at)
+
+    @property
+    def run_seconds(self) -> float:
+        """Execution time on the server (falls back to submit-to-finish)."""
+        if self.events is None or not self.events.started_at:
+            return self.finished_at - self.submitted_at
+        return (self.events.finished_at or self.finished_at) - self.events.started_at
+
+
+FAILURE_MESSAGES = {
+    'queue': "FAILED to queue: {}",
+    'error': "ERROR: {}",
+    'timeout': "TIMEOUT {}",
+    'output': "No output file found",
+    'fetch': "Download failed: {}",
+    'cancelled': "Cancelled: {}",
+}
+
+
+def describe_failure(result: JobResult) -> str:
+    return FAILURE_MESSAGES.get(result.error, "{}").format(result.detail)
+
+
+def pick_record(done) -> dict:
+    """Which batch candidate a post-processed job kept, for the cache index."""
+    if not done.scores:
+        return {}
+    return {
+        'pick': {
+            'seed': workflow_seed(done.result.job.workflow),
+            'batch_index': done.pick,
+            'score': done.scores[done.pick],
+        }
+    }
+
+
+def add_pipeline_args(parser):
+    """Register the shared engine options on a script's ArgumentParser."""
+    parser.add_argument('--backend', dest='backends', action='append', metavar='URL',
+                        help=f"ComfyUI server; repeat to shard the run across several (default {COMFYUI_URL})")
+    parser.add_argument('--window', type=int, default=DEFAULT_WINDOW,
+                        help=f"max prompts in flight per ComfyUI server (default {DEFAULT_WINDOW})")
+    parser.add_argument('--no-ws', dest='use_ws', action='store_false',
+                        help="poll /history instead of listening on the ComfyUI WebSocket")
+    parser.add_argument('--priority', choices=PRIORITY_ORDERS, default=DEFAULT_PRIORITY,
+                        help="generation order: every lv0 before any lv1 and so on (level), or as the "
+                             f"scripts list the jobs (manifest) (default {DEFAULT_PRIORITY})")
+    parser.add_argument('--hot', nargs='+', type=int, default=[], metavar='AURA_ID',
+                        help="generate these auras before all others")
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES,
+                        help=f"re-submit a timed-out or failed job up to N times (default {DEFAULT_RETRIES})")
+    parser.add_argument('--reseed', action='store_true',
+                        help="retry with a different seed instead of the same one")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f"post-processing worker processes (default {DEFAULT_WORKERS})")
+    parser.add_argument('--matting', choices=MATTING_MODES, default=DEFAULT_MATTING,
+                        help="background removal: NumPy white key with rembg fallback when unsure (auto), "
+                             f"key only, or rembg only (default {DEFAULT_MATTING})")
+    parser.add_argument('--matting-model', choices=sorted(MATTING_MODELS), default=DEFAULT_MATTING_MODEL,
+                        help=f"rembg model for background removal (default {DEFAULT_MATTING_MODEL})")
+    parser.add_argument('--encoder', choices=ENCODERS, default=DEFAULT_ENCODER,
+                        help="PNG encoder: 256-colour RGBA palette, or the lossless optimize=True "
+                             f"(default {DEFAULT_ENCODER})")
+    parser.add_argument('--dither', action='store_true', help="dither when quantising to the palette")
+    parser.add_argument('--candidates', type=int, default=1,
+                        help="sample K images per job in one batch and keep the best-scoring one")
+    parser.add_argument('--variants', action='store_true',
+                        help="also write WebP/AVIF and 256/128 px renditions, listed in <web root>/assets.json")
+    parser.add_argument('--hashed', action='store_true',
+                        help="also publish content-hashed copies (lv0.<hash>.png) listed in "
+                             "<web root>/asset-manifest.json, for immutable caching")
+    parser.add_argument('--rewrite-unchanged', action='store_true',
+                        help="write regenerated images even when they look the same as the published ones "
+                             "(by perceptual hash)")
+    parser.add_argument('--atlas', action='store_true',
+                        help="pack each directory of lv0..lv4.png into a trimmed atlas.png + atlas.json")
+    parser.add_argument('--atlas-grid', action='store_true',
+                        help="also pack every aura's lv0.png into one lv0-atlas.png for the encyclopedia")
+    parser.add_argument('--no-cache', dest='use_cache', action='store_false',
+                        help="regenerate every image, ignoring (but refreshing) the generation cache")
+    parser.add_argument('--cache-dir', help="generation cache location (default .gen_cache/)")
+    parser.add_argument('--plan', action='store_true',
+                        help="dry run: resolve the cache and estimate the run time from earlier runs' "
+                             "timings without submitting anything")
+    parser.add_argument('--metrics', metavar='PATH',
+                        help="per-job stage timings as JSON lines (default <cache-dir>/runs/<time>.jsonl)")
+    return parser
+
+
+def with_batch_size(workflow: dict, batch_size: int) -> dict:
+    """Sample `batch_size` candidates in one pass by widening EmptyLatentImage."""
+    if batch_size <= 1:
+        return workflow
+    for node in workflow['prompt'].values():
+        if node['class_type'] == 'EmptyLatentImage':
+            node['inputs']['batch_size'] = batch_size
+    return workflow
+
+
+def reseed_workflow(workflow: dict, offset: int) -> dict:
+    """A copy of `workflow` with `offset` added to every KSampler seed."""
+    workflow = copy.deepcopy(workflow)
+    for node in workflow['prompt'].values():
+        if node['class_type'] == 'KSampler':
+            node['inputs']['seed'] = (node['inputs'].get('seed', 0) + offset) % 2 ** 64
+    return workflow
+
+
+def workflow_seed(workflow: dict) -> int:
+    for node in workflow['prompt'].values():
+        if node['class_type'] == 'KSampler':
+            return node['inputs'].get('seed')
+    return None
+
+
+def system_stats(url: str = None, timeout: float = None) -> dict:
+    return client.get_json(f"{url or COMFYUI_URL}/system_stats", timeout)
+
+
+def check_connection(url: str = None) -> bool:
+    """Print the GPU name, or a hint to start ComfyUI; return whether it is up."""
+    where = f" at {url}" if url else ""
+    try:
+        stats = system_stats(url)
+        gpu = stats.get("devices", [{}])[0].get("name", "unknown")
+        print(f"ComfyUI connected{where}: {gpu}")
+        return True
+    except Exception as e:
+        print(f"ComfyUI not available{where}: {e}")
+        print("Please start ComfyUI first!")
+        return False
+
+
+def queue_prompt(workflow: dict, client_id: str = None, url: str = None) -> str:
+    if client_id:
+        workflow = dict(workflow, client_id=client_id)
+    return client.post_json(f"{url or COMFYUI_URL}/prompt", workflow)['prompt_id']
+
+
+def get_history(prompt_id: str, url: str = None) -> dict:
+    return client.get_json(f"{url or COMFYUI_URL}/history/{prompt_id}").get(prompt_id)
+
+
+def history_state(entry: dict) -> str:
+    """Classify a /history entry as 'done', 'error' or 'pending'."""
+    if not entry:
+        return 'pending'
+    status = entry.get('status', {})
+    if status.get('completed', False) or status.get('status_str') == 'success':
+        return 'done'
+    if status.get('status_str') == 'error':
+        return 'error'
+    return 'pending'
+
+
+def queue_ids(url: str = None) -> tuple:
+    """(running, pending) prompt_id sets from GET /queue."""
+    queue = client.get_json(f"{url or COMFYUI_URL}/queue")
+    return tuple({item[1] for item in queue.get(name, []) if len(item) > 1}
+                 for name in ('queue_running', 'queue_pending'))
+
+
+def prompt_state(prompt_id: str, url: str = None) -> str:
+    """
+    'done' or 'error' from /history, 'pending' while it is still in /queue,
+    '' if the server does not know the prompt (e.g. it was restarted).
+    """
+    state = history_state(get_history(prompt_id, url))
+    if state != 'pending':
+        return state
+    running, waiting = queue_ids(url)
+    return 'pending' if prompt_id in running | waiting else ''
+
+
+def cancel_prompt(prompt_id: str, url: str = None) -> str:
+    """
+    Take a prompt off the server: 'interrupted' if it was running,
+    'deleted' if it was still queued, '' if it had already finished.
+    Other clients' prompts are never interrupted.
+    """
+    url = url or COMFYUI_URL
+    running, waiting = queue_ids(url)
+    if prompt_id in running:
+        # servers that ignore prompt_id interrupt whatever runs, which we just checked is ours
+        client.post_json(f"{url}/interrupt", {'prompt_id': prompt_id})
+        return 'interrupted'
+    if prompt_id in waiting:
+        client.post_json(f"{url}/queue", {'delete': [prompt_id]})
+        return 'deleted'
+    return ''
+
+
+def find_output_images(history: dict, nodes=None) -> list:
+    """Return every {filename, subfolder, type} image ref in a history entry (or just `nodes`' outputs)."""
+    refs = []
+    try:
+        for node_id, node_out in history.get('outputs', {}).items():
+            if nodes is None or node_id in nodes:
+                refs.extend(node_out.get('images', []))
+    except Exception:
+        pass
+    return [ref for ref in refs if ref.get('filename')]
+
+
+def fetch_image(ref: dict, url: str = None) -> bytes:
+    query = urllib.parse.urlencode({
+        'filename': ref.get('filename', ''),
+        'subfolder': ref.get('subfolder', ''),
+        'type': ref.get('type', 'output'),
+    })
+    return client.get(f"{url or COMFYUI_URL}/view?{query}")
+
+
+def _download(result: JobResult):
+    refs = find_output_images(result.history)
+    if not refs:
+        result.error = 'output'
+        return
+    start = time.time()
+    try:
+        result.images = [fetch_image(ref, result.backend) for ref in refs]
+        result.download_seconds = time.time() - start
+    except Exception as e:
+        result.error, result.detail = 'fetch', str(e)
+
+
+def _reachable(url: str) -> bool:
+    try:
+        system_stats(url, timeout=PROBE_TIMEOUT)
+        return True
+    except Exception:
+        return False
+
+
+def _cancel(backend, result: JobResult, now: float) -> float:
+    """Cancel a prompt we gave up on; returns the GPU seconds it had already used."""
+    try:
+        how = cancel_prompt(result.prompt_id, backend.url)
+    except Exception:
+        return 0.0
+    if how != 'interrupted':
+        return 0.0
+    events = backend.tracker.get(result.prompt_id) if backend.tracker is not None else None
+    # without events the start is unknown; submit time gives an upper bound
+    started = events.started_at if events is not None and events.started_at else result.submitted_at
+    return max(0.0, now - started)
+
+
+def _cancel_queued(pool: BackendPool) -> list:
+    """Delete our prompts that have not started yet; returns their results, marked cancelled."""
+    cancelled = []
+    for backend in pool.alive:
+        try:
+            waiting = queue_ids(backend.url)[1] & set(backend.in_flight) if backend.in_flight else set()
+            if waiting:
+                client.post_json(f"{backend.url}/queue", {'delete': sorted(waiting)})
+        except Exception:
+            continue
+        for prompt_id in waiting:
+            result = backend.in_flight.pop(prompt_id)
+            backend.orphans.discard(prompt_id)
+            result.error, result.detail = 'cancelled', "run interrupted before it started"
+            result.finished_at = time.time()
+            cancelled.append(result)
+    return cancelled
+
+
+def _abandon(pool: BackendPool):
+    """Cancel every prompt still in flight when the pipeline is closed early."""
+    count = 0
+    for backend in pool.alive:
+        for prompt_id in list(backend.in_flight):
+            try:
+                count += bool(cancel_prompt(prompt_id, backend.url))
+            except Exception:
+                pass
+        backend.in_flight.clear()
+    if count:
+        print(f"Cancelled {count} prompt(s) still on ComfyUI")
+
+
+def _retry(result: JobResult, retries: int, reseed: bool) -> bool:
+    """Schedule another attempt of a failed job if it has one left; returns whether it did."""
+    job = result.job
+    attempt = job.meta.get('attempt', 0) + 1
+    if result.error not in RETRYABLE or attempt > retries:
+        return False
+    delay = RETRY_BACKOFF * 2 ** (attempt - 1) * random.uniform(1 - RETRY_JITTER, 1 + RETRY_JITTER)
+    job.meta.update(attempt=attempt, retry_at=time.time() + delay, zombie_seconds=result.zombie_seconds)
+    if reseed:
+        # a chain's level jobs are reseeded with it, since its result is cached per level
+        for reseeded in [job] + job.meta.get('levels', []):
+            reseeded.workflow = reseed_workflow(reseeded.workflow, RESEED_STRIDE)
+            # GenerationCache keys were taken from the old workflow
+            reseeded.meta.pop('cache_key', None)
+            reseeded.meta.pop('cache_out', None)
+    print(f"{job.label} {describe_failure(result)}; retry {attempt}/{retries} in {delay:.1f}s"
+          + (" with a new seed" if reseed else ""))
+    return True
+
+
+def _next_ready(pending: list, now: float) -> int:
+    """Index of the next job to submit (the stack top first), skipping retries still backing off."""
+    for i in range(len(pending) - 1, -1, -1):
+        if pending[i].meta.get('retry_at', 0.0) <= now:
+            return i
+    return None
+
+
+def _reattach(pool: BackendPool, pending: list, attach: dict):
+    """Adopt prompts an earlier run queued ({job key: (prompt_id, backend)}) that the server still knows."""
+    for job in list(pending):
+        prompt_id, url = attach.get(job.key, ('', ''))
+        backend = pool.get(url)
+        if not prompt_id or backend is None or not backend.alive:
+            continue
+        try:
+            if not prompt_state(prompt_id, url):
+                continue
+        except Exception:
+            continue
+        backend.in_flight[prompt_id] = JobResult(job=job, prompt_id=prompt_id, backend=url,
+                                                 submitted_at=time.time())
+        backend.orphans.add(prompt_id)
+        pending.remove(job)
+
+
+def run_pipeline(jobs, window: int = DEFAULT_WINDOW, use_ws: bool = True, backends: list = None,
+                 attach: dict = None, on_submit=None, retries: int = 0, reseed: bool = False,
+                 stop=None):
+    """
+    Submit `jobs` keeping at most `window` in flight per backend and yield a
+    JobResult for each one as soon as it finishes, in completion order.
+    With several backend URLs each job goes to the least-loaded live server,
+    and jobs on a server that stops answering are re-submitted elsewhere.
+    Completion comes from the ComfyUI WebSocket when available; /history
+    polling is the fallback.
+    `attach` maps job keys to (prompt_id, backend) left by a crashed run;
+    those prompts are waited on instead of resubmitted. `on_submit(result)`
+    is called once each prompt is queued.
+    Failures in RETRYABLE are re-submitted up to `retries` times, with new
+    seeds if `reseed`. Once the `stop` event is set nothing new is
+    submitted: queued prompts are deleted and yielded as 'cancelled', running
+    ones are still collected. Closing the generator early cancels whatever
+    is left on the servers.
+    """
+    pending = list(jobs)
+    pending.reverse()
+    window = max(1, window)
+    pool = BackendPool(backends or [COMFYUI_URL], use_ws=use_ws and bool(pending))
+    if attach:
+        _reattach(pool, pending, attach)
+
+    draining = False
+    try:
+        while pending or pool.busy:
+            if stop is not None and stop.is_set():
+                if not draining:
+                    draining = True
+                    yield from _cancel_queued(pool)
+                for job in reversed(pending):
+                    yield JobResult(job=job, error='cancelled', detail="run interrupted",
+                                    finished_at=time.time(), zombie_seconds=job.meta.get('zombie_seconds', 0.0))
+                pending.clear()
+            while pending:
+                index = _next_ready(pending, time.time())
+                if index is None:
+                    break
+                backend = pool.pick(window)
+                if backend is None:
+                    break
+                job = pending.pop(index)
+                result = JobResult(job=job, backend=backend.url, submitted_at=time.time(),
+                                   zombie_seconds=job.meta.get('zombie_seconds', 0.0))
+                try:
+                    result.prompt_id = queue_prompt(job.workflow, backend.client_id, backend.url)
+                except HTTPError as e:
+                    result.error, result.detail = 'queue', f"{e} {e.body[:300].decode('utf-8', 'replace')}"
+                except OSError:
+                    # connection-level failure: the server is gone, not the job
+                    pending.append(job)
+                    pending.extend(reversed(pool.drop(backend)))
+                    continue
+                except Exception as e:
+                    result.error, result.detail = 'queue', str(e)
+                if result.error:
+                    result.finished_at = time.time()
+                    yield result
+                    continue
+                backend.in_flight[result.prompt_id] = result
+                if on_submit is not None:
+                    on_submit(result)
+
+            if not pool.alive:
+                for job in reversed(pending):
+                    yield JobResult(job=job, error='queue', detail="no ComfyUI backend reachable",
+                                    finished_at=time.time())
+                return
+            if not pool.busy:
+                if pending:
+                    # only retries backing off are left
+                    retry_at = min(job.meta.get('retry_at', 0.0) for job in pending)
+                    time.sleep(max(0.0, min(POLL_INTERVAL, retry_at - time.time())))
+                continue
+
+            ready = pool.wait(POLL_INTERVAL)
+
+            finished = []
+            for backend in pool.alive:
+                check = set(backend.in_flight) if backend.due_for_check(WS_RECHECK_INTERVAL) else set()
+                for prompt_id in check | ((ready | backend.orphans) & set(backend.in_flight)):
+                    result = backend.in_flight[prompt_id]
+                    try:
+                        entry = get_history(prompt_id, backend.url)
+                    except Exception:
+                        if not _reachable(backend.url):
+                            pending.extend(reversed(pool.drop(backend)))
+                            break
+                        entry = None
+                    state = history_state(entry)
+                    now = time.time()
+                    if state == 'done':
+                        result.history = entry
+                        _download(result)
+                    elif state == 'error':
+                        result.error = 'error'
+                        result.detail = json.dumps(entry.get('status', {}))[:500]
+                    elif now - result.submitted_at > result.job.timeout:
+                        result.error, result.detail = 'timeout', f"after {result.job.timeout}s"
+                        result.zombie_seconds += _cancel(backend, result, now)
+                    else:
+                        continue
+                    result.finished_at = now
+                    if backend.tracker is not None:
+                        result.events = backend.tracker.get(prompt_id)
+                    if result.ok:
+                        backend.observe(result.run_seconds)
+                    del backend.in_flight[prompt_id]
+                    backend.orphans.discard(prompt_id)
+                    if not result.ok and not draining and _retry(result, retries, reseed):
+                        pending.append(result.job)
+                        continue
+                    finished.append(result)
+
+            yield from finished
+    finally:
+        _abandon(pool)
+        pool.close()
@@ -0,0 +1,422 @@
+"""
+Local stand-in for a ComfyUI server, for benchmarking the orchestrator on a
+machine without a GPU.
+Implements /prompt, /queue, /interrupt, /history, /view, /system_stats and
+the /ws event stream. Node execution is simulated with configurable delays,
+ComfyUI-style node caching between prompts, and synthetic PNG outputs.
+"""
+
+import base64
+import hashlib
+import json
+import random
+import socket
+import struct
+import threading
+import time
+import uuid
+import zlib
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+LOADERS = {'UnetLoaderGGUF', 'DualCLIPLoaderGGUF', 'VAELoader', 'CheckpointLoaderSimple'}
+
+
+@dataclass
+class FakeTimings:
+    """Simulated seconds per node; KSampler/VAEDecode scale with batch size."""
+    load: float = 0.5
+    encode: float = 0.05
+    sample: float = 0.4
+    # KSampler steps `sample` covers; fewer steps (e.g. partial denoise) take proportionally less
+    steps: int = 4
+    decode: float = 0.05
+    save: float = 0.01
+    jitter: float = 0.1  # +/- fraction applied to every delay
+
+
+def synthetic_png(width: int, height: int, seed: int) -> bytes:
+    """A coloured disc on a white background, encoded with zlib only."""
+    rng = random.Random(seed)
+    color = bytes(rng.randrange(40, 220) for _ in range(3))
+    cx = width // 2 + rng.randrange(-width // 10, width // 10 + 1)
+    cy = height // 2 + rng.randrange(-height // 10, height // 10 + 1)
+    r = min(width, height) * rng.uniform(0.2, 0.35)
+    white = b'\xff\xff\xff'
+    rows = []
+    for y in range(height):
+        dy = y - cy
+        half = int((r * r - dy * dy) ** 0.5) if abs(dy) < r else -1
+        if half < 0:
+            rows.append(b'\x00' + white * width)
+        else:
+            left, right = max(0, cx - half), min(width, cx + half)
+            rows.append(b'\x00' + white * left + color * (right - left) + white * (width - right))
+
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header)
+            + chunk(b'IDAT', zlib.compress(b''.join(rows), 1)) + chunk(b'IEND', b''))
+
+
+class FakeComfyUI:
+    """A single-"GPU" server executing one prompt at a time, like ComfyUI."""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, timings: FakeTimings = None,
+                 gpu_name: str = 'FakeGPU'):
+        self.timings = timings or FakeTimings()
+        self.gpu_name = gpu_name
+        self.history = {}
+        self.files = {}
+        self.clients = {}
+        # (prompt_id, started, finished) for every executed prompt
+        self.executions = []
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._pending = []
+        self._running = None
+        self._interrupt = threading.Event()
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._number = 0
+        self._file_counter = 0
+        self._loaded = set()
+        self._cached_signatures = set()
+        self._closed = False
+        self._connections = set()
+        # TCP connections accepted, to measure client keep-alive reuse
+        self.connections_accepted = 0
+
+        self.httpd = ThreadingHTTPServer((host, port), _make_handler(self))
+        self.httpd.daemon_threads = True
+        self.url = f"http://{host}:{self.httpd.server_address[1]}"
+        self._threads = [
+            threading.Thread(target=self.httpd.serve_forever, name='fake-comfy-http', daemon=True),
+            threading.Thread(target=self._worker, name='fake-comfy-gpu', daemon=True),
+        ]
+        for t in self._threads:
+            t.start()
+
+    def close(self):
+        """Stop like a crashed server: abort the running prompt and drop every connection."""
+        self._closed = True
+        self.httpd.shutdown()
+        try:
+            # forked children (e.g. post-processing workers) may share the
+            # listening socket; shutdown() stops it accepting in all of them
+            self.httpd.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.httpd.server_close()
+        for sock in list(self._connections):
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self._interrupt.set()
+        with self._wake:
+            self._wake.notify_all()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # -- event stream -------------------------------------------------------
+
+    def _send(self, client_id: str, kind: str, data: dict):
+        sender = self.clients.get(client_id)
+        if sender is None:
+            return
+        try:
+            sender(json.dumps({'type': kind, 'data': data}))
+        except OSError:
+            self.clients.pop(client_id, None)
+
+    def _broadcast_status(self):
+        with self._lock:
+            remaining = len(self._pending) + (1 if self._running else 0)
+        for client_id in list(self.clients):
+            self._send(client_id, 'status', {'status': {'exec_info': {'queue_remaining': remaining}}})
+
+    # -- queue --------------------------------------------------------------
+
+    def submit(self, prompt: dict, client_id: str = None) -> dict:
+        with self._wake:
+            self._number += 1
+            item = {'number': self._number, 'prompt_id': uuid.uuid4().hex,
+                    'prompt': prompt, 'client_id': client_id}
+            self._pending.append(item)
+            self._wake.notify_all()
+        self._broadcast_status()
+        return {'prompt_id': item['prompt_id'], 'number': item['number'], 'node_errors': {}}
+
+    def queue_state(self) -> dict:
+        def entry(item):
+            return [item['number'], item['prompt_id'], item['prompt'], {'client_id': item['client_id']}, []]
+        with self._lock:
+            return {
+                'queue_running': [entry(self._running)] if self._running else [],
+                'queue_pending': [entry(item) for item in self._pending],
+            }
+
+    def delete(self, prompt_ids=None, clear: bool = False):
+        with self._lock:
+            if clear:
+                self._pending = []
+            else:
+                self._pending = [i for i in self._pending if i['prompt_id'] not in set(prompt_ids or [])]
+
+    def interrupt(self, prompt_id: str = None):
+        """Stop the running prompt; with a prompt_id, only if that one is running (as newer ComfyUI does)."""
+        with self._lock:
+            if prompt_id is None or (self._running and self._running['prompt_id'] == prompt_id):
+                self._interrupt.set()
+
+    # -- execution ----------------------------------------------------------
+
+    def _delay(self, seconds: float):
+        jitter = self.timings.jitter
+        seconds *= 1 + random.uniform(-jitter, jitter)
+        if self._interrupt.wait(max(0.0, seconds)):
+            raise InterruptedError
+
+    def _signatures(self, prompt: dict) -> dict:
+        """ComfyUI-style cache keys: a node's inputs with links replaced by the upstream key."""
+        sigs = {}
+
+        def sig(node_id):
+            if node_id not in sigs:
+                node = prompt[node_id]
+                inputs = {}
+                for name, value in node.get('inputs', {}).items():
+                    if isinstance(value, list) and len(value) == 2 and str(value[0]) in prompt:
+                        inputs[name] = [sig(str(value[0])), value[1]]
+                    else:
+                        inputs[name] = value
+                text = json.dumps([node['class_type'], inputs], sort_keys=True)
+                sigs[node_id] = hashlib.sha1(text.encode()).hexdigest()
+            return sigs[node_id]
+
+        for node_id in prompt:
+            sig(node_id)
+        return sigs
+
+    @staticmethod
+    def _upstream(prompt: dict, node_id: str, class_type: str) -> dict:
+        """The nearest node of `class_type` feeding `node_id`, breadth first."""
+        frontier = [node_id]
+        while frontier:
+            nxt = []
+            for nid in frontier:
+                for value in prompt[nid].get('inputs', {}).values():
+                    if isinstance(value, list) and len(value) == 2 and str(value[0]) in prompt:
+                        upstream = prompt[str(value[0])]
+                        if upstream['class_type'] == class_type:
+                            return upstream
+                        nxt.append(str(value[0]))
+            frontier = nxt
+        return None
+
+    def _execute(self, item: dict):
+        prompt, pid, cid = item['prompt'], item['prompt_id'], item['client_id']
+        t = self.timings
+        sigs = self._signatures(prompt)
+        cached = [n for n, s in sigs.items()
+                  if s in self._cached_signatures and prompt[n]['class_type'] != 'SaveImage']
+        self.cache_hits += len(cached)
+        self.cache_misses += len(sigs) - len(cached)
+        self._send(cid, 'execution_start', {'prompt_id': pid})
+        self._send(cid, 'execution_cached', {'nodes': cached, 'prompt_id': pid})
+
+        batch = max([n['inputs'].get('batch_size', 1) for n in prompt.values()
+                     if n['class_type'] == 'EmptyLatentImage'] or [1])
+        outputs = {}
+        for node_id, node in prompt.items():
+            if node_id in cached:
+                continue
+            kind = node['class_type']
+            self._send(cid, 'executing', {'node': node_id, 'prompt_id': pid})
+            if kind in LOADERS:
+                key = json.dumps(node['inputs'], sort_keys=True)
+                if (kind, key) not in self._loaded:
+                    self._delay(t.load)
+                    self._loaded.add((kind, key))
+            elif kind.startswith('CLIPTextEncode'):
+                self._delay(t.encode)
+            elif kind == 'KSampler':
+                steps = int(node['inputs'].get('steps', 4))
+                for step in range(steps):
+                    self._delay(t.sample * batch / t.steps)
+                    self._send(cid, 'progress', {'value': step + 1, 'max': steps,
+                                                 'prompt_id': pid, 'node': node_id})
+            elif kind == 'VAEDecode':
+                self._delay(t.decode * batch)
+            elif kind == 'SaveImage':
+                self._delay(t.save)
+                latent = self._upstream(prompt, node_id, 'EmptyLatentImage')
+                size = latent['inputs'] if latent else {'width': 512, 'height': 512}
+                sampler = self._upstream(prompt, node_id, 'KSampler')
+                seed = sampler['inputs'].get('seed', 0) if sampler else 0
+                images = []
+                for i in range(batch):
+                    self._file_counter += 1
+                    name = f"{node['inputs'].get('filename_prefix', 'ComfyUI')}_{self._file_counter:05d}_.png"
+                    self.files[name] = synthetic_png(size['width'], size['height'], seed + i)
+                    images.append({'filename': name, 'subfolder': '', 'type': 'output'})
+                outputs[node_id] = {'images': images}
+                self._send(cid, 'executed', {'node': node_id, 'output': outputs[node_id], 'prompt_id': pid})
+        self._cached_signatures = set(sigs.values())
+        return outputs
+
+    def _worker(self):
+        while True:
+            with self._wake:
+                while not self._pending and not self._closed:
+                    self._wake.wait()
+                if self._closed:
+                    return
+                item = self._running = self._pending.pop(0)
+                self._interrupt.clear()
+            pid, cid = item['prompt_id'], item['client_id']
+            started = time.time()
+            try:
+                outputs = self._execute(item)
+                status = {'status_str': 'success', 'completed': True, 'messages': []}
+                self._send(cid, 'execution_success', {'prompt_id': pid})
+            except InterruptedError:
+                outputs = {}
+                status = {'status_str': 'error', 'completed': False, 'messages': [['execution_interrupted', {}]]}
+                self._send(cid, 'execution_interrupted', {'prompt_id': pid})
+            finished = time.time()
+            with self._lock:
+                self.history[pid] = {'prompt': [item['number'], pid, item['prompt'], {}, []],
+                                     'outputs': outputs, 'status': status}
+                self.executions.append((pid, started, finished))
+                self._running = None
+            self._send(cid, 'executing', {'node': None, 'prompt_id': pid})
+            self._broadcast_status()
+
+
+def _make_handler(server: FakeComfyUI):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # headers and body go out as separate writes; with Nagle on, the body waits
+        # for the client's delayed ACK (~40 ms per keep-alive request on localhost)
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def setup(self):
+            super().setup()
+            server._connections.add(self.connection)
+            server.connections_accepted += 1
+
+        def finish(self):
+            super().finish()
+            server._connections.discard(self.connection)
+
+        def _json(self, obj, code: int = 200):
+            body = json.dumps(obj).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _body(self) -> dict:
+            length = int(self.headers.get('Content-Length') or 0)
+            return json.loads(self.rfile.read(length) or b'{}')
+
+        def do_POST(self):
+            path = urlsplit(self.path).path
+            if path == '/prompt':
+                body = self._body()
+                return self._json(server.submit(body['prompt'], body.get('client_id')))
+            if path == '/queue':
+                body = self._body()
+                server.delete(body.get('delete'), clear=body.get('clear', False))
+                return self._json({})
+            if path == '/interrupt':
+                server.interrupt(self._body().get('prompt_id'))
+                return self._json({})
+            self._json({'error': 'not found'}, 404)
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            query = parse_qs(url.query)
+            if url.path == '/ws':
+                return self._websocket(query.get('clientId', [uuid.uuid4().hex])[0])
+            if url.path == '/system_stats':
+                return self._json({'system': {'os': 'fake'},
+                                   'devices': [{'name': server.gpu_name, 'type': 'cuda'}]})
+            if url.path == '/queue':
+                return self._json(server.queue_state())
+            if url.path == '/history':
+                return self._json(dict(server.history))
+            if url.path.startswith('/history/'):
+                pid = url.path.rsplit('/', 1)[1]
+                entry = server.history.get(pid)
+                return self._json({pid: entry} if entry else {})
+            if url.path == '/view':
+                data = server.files.get(query.get('filename', [''])[0])
+                if data is None:
+                    return self._json({'error': 'not found'}, 404)
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/png')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                return
+            self._json({'error': 'not found'}, 404)
+
+        def _websocket(self, client_id: str):
+            key = self.headers.get('Sec-WebSocket-Key', '')
+            accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+            self.send_response(101)
+            self.send_header('Upgrade', 'websocket')
+            self.send_header('Connection', 'Upgrade')
+            self.send_header('Sec-WebSocket-Accept', accept)
+            self.end_headers()
+            self.wfile.flush()
+            lock = threading.Lock()
+
+            def send(text: str):
+                data = text.encode('utf-8')
+                if len(data) < 126:
+                    header = bytes([0x81, len(data)])
+                elif len(data) < 1 << 16:
+                    header = bytes([0x81, 126]) + len(data).to_bytes(2, 'big')
+                else:
+                    header = bytes([0x81, 127]) + len(data).to_bytes(8, 'big')
+                with lock:
+                    self.wfile.write(header + data)
+                    self.wfile.flush()
+
+            server.clients[client_id] = send
+            server._broadcast_status()
+            try:
+                # discard client frames until it closes or goes away
+                while True:
+                    head = self.rfile.read(2)
+                    if len(head) < 2 or head[0] & 0x0F == 0x8:
+                        break
+                    length = head[1] & 0x7F
+                    if length == 126:
+                        length = int.from_bytes(self.rfile.read(2), 'big')
+                    elif length == 127:
+                        length = int.from_bytes(self.rfile.read(8), 'big')
+                    self.rfile.read(length + (4 if head[1] & 0x80 else 0))
+            except OSError:
+                pass
+            server.clients.pop(client_id, None)
+            self.close_connection = True
+
+    return Handler
@@ -0,0 +1,34 @@
+"""
+Atomic file writes for outputs and cache entries.
+Everything lands in a hidden temp file in the target directory first and is
+then renamed over the destination, so a crash or a concurrent reader (the
+Vite dev server, the next run's cache check) never sees a half-written file.
+"""
+
+import os
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+
+
+@contextmanager
+def atomic_path(dst):
+    """Yield a temp path next to `dst`; it replaces `dst` only if the block succeeds."""
+    dst = Path(dst)
+    tmp = dst.with_name(f".{dst.name}.{os.getpid()}.tmp")
+    try:
+        yield tmp
+        os.replace(tmp, dst)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def atomic_write(dst, data: bytes):
+    with atomic_path(dst) as tmp:
+        Path(tmp).write_bytes(data)
+
+
+def atomic_copy(src, dst):
+    with atomic_path(dst) as tmp:
+        shutil.copyfile(src, tmp)
@@ -0,0 +1,154 @@
+"""
+Content-hashed copies of the published images, for immutable caching.
+The app loads fixed paths like /auras/3/lv0.png, so every regeneration
+forces a choice between stale browser caches and short cache lifetimes.
+publish_hashed() copies each output, and each of its web renditions, to a
+name carrying its content hash (lv0.3f9a0c2e1b.png, lv0@256.77d1e0a9c4.webp)
+and lists them in <web root>/asset-manifest.json:
+
+    {"version": 1,
+     "assets": {"3": {"lv0": {"png": {"file": "/auras/3/lv0.3f9a0c2e1b.png",
+                                      "type": "image/png", "bytes": 14021,
+                                      "width": 512, "height": 512},
+                              "webp@256": {...}, ...},
+                      "base": {...}},
+                "evolution": {"lv0": {...}, ...}}}
+
+keyed by aura id (or directory), level ('base' for an aura's base image)
+and variant (format, plus @size for the smaller renditions). Hashed files
+can be served with `Cache-Control: immutable`; only the manifest needs
+revalidating, and an unchanged image keeps its name across runs. Files a
+run replaces stay on disk for RETAIN_DAYS so clients holding the older
+manifest can still load them.
+"""
+
+import hashlib
+import io
+import json
+import re
+import time
+from pathlib import Path
+
+from .fileio import atomic_write
+from .variants import MIME_TYPES, RENDITION_SIZES, manifest_location, variant_name
+
+MANIFEST_NAME = "asset-manifest.json"
+HASH_LENGTH = 10
+# How long a replaced hashed file is kept for clients with the old manifest
+RETAIN_DAYS = 7
+
+HASHED_FILE = re.compile(rf'\.[0-9a-f]{{{HASH_LENGTH}}}\.\w+$')
+
+
+def is_hashed_copy(path) -> bool:
+    return bool(HASHED_FILE.search(Path(path).name))
+
+
+def asset_key(job) -> tuple:
+    """(group, name) of a job's output in the manifest, e.g. ('3', 'lv0')."""
+    group = str(job.aura) if job.aura is not None else job.dst.parent.name
+    if job.level is not None:
+        return group, f"lv{job.level}"
+    return group, 'base' if job.aura is not None else job.dst.stem
+
+
+def variant_files(dst: Path) -> list:
+    """[(variant, path)] for dst and the renditions written with it (not stale ones from older runs)."""
+    dst = Path(dst)
+    written = dst.stat().st_mtime_ns
+    found = []
+    for size in (None,) + tuple(RENDITION_SIZES):
+        for fmt in MIME_TYPES:
+            path = dst.with_name(variant_name(dst, size, fmt))
+            if path == dst or (path.exists() and path.stat().st_mtime_ns >= written):
+                found.append((fmt + (f"@{size}" if size else ""), path))
+    return found
+
+
+def hashed_copy(src: Path) -> tuple:
+    """Write src's content-hashed copy unless it exists; returns (its path, its manifest entry)."""
+    from PIL import Image
+    data = src.read_bytes()
+    digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+    dst = src.with_name(f"{src.stem}.{digest}{src.suffix}")
+    if not dst.exists():
+        atomic_write(dst, data)
+    with Image.open(io.BytesIO(data)) as img:
+        width, height = img.size
+    entry = {
+        'type': MIME_TYPES[src.suffix.lstrip('.')],
+        'bytes': len(data),
+        'width': width,
+        'height': height,
+    }
+    return dst, entry
+
+
+class AssetManifest:
+    """asset-manifest.json: group -> name -> variant -> hashed file entry."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.root = self.path.parent
+        try:
+            data = json.loads(self.path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            data = {}
+        self.assets = data.get('assets', {})
+        # web path -> when a run stopped listing it
+        self.retired = data.get('retired', {})
+
+    def _files(self) -> set:
+        return {entry['file'] for names in self.assets.values() for variants in names.values()
+                for entry in variants.values()}
+
+    def set(self, group: str, name: str, variants: dict):
+        """Replace one asset's variants, retiring the hashed files it no longer uses."""
+        old = {entry['file'] for entry in self.assets.get(group, {}).get(name, {}).values()}
+        self.assets.setdefault(group, {})[name] = dict(sorted(variants.items()))
+        for file in old - {entry['file'] for entry in variants.values()}:
+            self.retired.setdefault(file, time.time())
+
+    def prune(self) -> int:
+        """Delete retired files older than RETAIN_DAYS that nothing lists again; returns how many."""
+        listed = self._files()
+        cutoff = time.time() - RETAIN_DAYS * 86400
+        removed = 0
+        for file, retired_at in list(self.retired.items()):
+            if file in listed:
+                del self.retired[file]
+            elif retired_at < cutoff:
+                (self.root / file.lstrip('/')).unlink(missing_ok=True)
+                del self.retired[file]
+                removed += 1
+        return removed
+
+    def save(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        data = {
+            'version': 1,
+            'assets': {group: dict(sorted(names.items())) for group, names in sorted(self.assets.items())},
+            'retired': dict(sorted(self.retired.items())),
+        }
+        atomic_write(self.path, json.dumps(data, indent=1).encode('utf-8'))
+
+
+def publish_hashed(jobs: list) -> list:
+    """Write the hashed copies of every job's output and update the manifests; returns them."""
+    manifests = {}
+    for job in jobs:
+        if not job.dst.exists():
+            continue
+        root = manifest_location(job.dst)[0].parent
+        path = root / MANIFEST_NAME
+        if path not in manifests:
+            manifests[path] = AssetManifest(path)
+        variants = {}
+        for variant, src in variant_files(job.dst):
+            copy, entry = hashed_copy(src)
+            variants[variant] = dict(file='/' + copy.relative_to(root).as_posix(), **entry)
+        manifests[path].set(*asset_key(job), variants)
+    for manifest in manifests.values():
+        manifest.prune()
+        manifest.save()
+    return list(manifests.values())
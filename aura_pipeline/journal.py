@@ -0,0 +1,87 @@
+"""
+Crash-safe job journal.
+Every stage change (submitted with its prompt_id and backend, generated,
+done, failed) is appended to <cache dir>/journal.jsonl and fsynced, so if the
+process dies the next run knows which prompts are still queued or already
+finished on ComfyUI and re-attaches to them instead of resubmitting. Entries
+are keyed by job and carry the workflow hash, so an edited prompt is never
+matched to a stale prompt_id. Finished entries are dropped when the journal
+is compacted at the end of a clean run.
+"""
+
+import json
+import os
+import time
+from pathlib import Path
+
+from .cache import workflow_key
+from .fileio import atomic_path
+
+JOURNAL_NAME = "journal.jsonl"
+# stages after which nothing is left to recover
+FINAL_STAGES = ('done', 'failed')
+
+
+class Journal:
+    """Append-only JSON-lines log of job stages, replayed on start-up."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.entries = {}  # job key -> latest record
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line from a crash
+                    self.entries[record['key']] = record
+        except OSError:
+            pass
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fh = open(self.path, 'a', encoding='utf-8')
+
+    def record(self, job, stage: str, **fields):
+        """Append `job`'s new stage; prompt_id/backend carry over from earlier stages."""
+        previous = self.entries.get(job.key, {})
+        record = {
+            'key': job.key,
+            'dst': str(job.dst),
+            'hash': workflow_key(job.workflow),
+            'stage': stage,
+            'prompt_id': previous.get('prompt_id', ''),
+            'backend': previous.get('backend', ''),
+            'at': time.time(),
+        }
+        record.update(fields)
+        self.entries[job.key] = record
+        self._fh.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+
+    def submitted(self, result):
+        self.record(result.job, 'submitted', prompt_id=result.prompt_id, backend=result.backend)
+
+    def attachable(self, jobs: list) -> dict:
+        """{job key: (prompt_id, backend)} for prompts a previous run left in flight."""
+        found = {}
+        for job in jobs:
+            entry = self.entries.get(job.key)
+            if (entry and entry['stage'] == 'submitted' and entry.get('prompt_id')
+                    and entry['hash'] == workflow_key(job.workflow)):
+                found[job.key] = (entry['prompt_id'], entry['backend'])
+        return found
+
+    def close(self):
+        """Rewrite the journal without finished entries."""
+        self._fh.close()
+        live = [e for e in self.entries.values() if e['stage'] not in FINAL_STAGES]
+        with atomic_path(self.path) as tmp:
+            Path(tmp).write_text(''.join(json.dumps(e, ensure_ascii=False) + '\n' for e in live),
+                                 encoding='utf-8')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,216 @@
+"""
+Per-job stage timing and run metrics.
+Every job that passes through run_jobs() becomes one JSON-lines record with
+its stage durations (queue wait, model load, text encode, sampling, VAE
+decode, download, resize, matting, PNG encode) and output size. The run
+summary reports p50/p95 per stage, GPU utilisation estimated from the idle
+gaps between executions, and bytes written. Everything is derived from
+timestamps the pipeline already takes, so it stays on for every run.
+"""
+
+import json
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from .workflow import model_signature
+
+# ComfyUI node class -> stage name in the records
+NODE_STAGES = {
+    'UnetLoaderGGUF': 'model_load',
+    'DualCLIPLoaderGGUF': 'model_load',
+    'VAELoader': 'model_load',
+    'CLIPTextEncodeFlux': 'text_encode',
+    'EmptyLatentImage': 'sample',
+    'KSampler': 'sample',
+    'VAEDecode': 'vae_decode',
+    'SaveImage': 'save_output',
+}
+
+STAGE_ORDER = ['queue', 'model_load', 'text_encode', 'sample', 'vae_decode', 'save_output',
+               'download', 'resize', 'matting', 'score', 'phash', 'png_encode', 'renditions', 'webp_encode',
+               'avif_encode', 'end_to_end']
+
+
+@contextmanager
+def stage_timer(timings: dict, stage: str):
+    """Add the wall time of the block to timings[stage]."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+
+def percentile(values: list, p: float) -> float:
+    """Nearest-rank percentile; 0.0 for an empty list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(p / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+def gpu_gaps(intervals: list) -> tuple:
+    """(busy seconds, span seconds, idle gaps) for (start, end) execution intervals."""
+    runs = sorted((start, end) for start, end in intervals if start and end)
+    if not runs:
+        return 0.0, 0.0, []
+    busy = sum(end - start for start, end in runs)
+    span = runs[-1][1] - runs[0][0]
+    gaps = [max(0.0, runs[i][0] - runs[i - 1][1]) for i in range(1, len(runs))]
+    return busy, span, gaps
+
+
+def job_record(done) -> dict:
+    """Flatten a postprocess.Processed into one metrics record."""
+    result = done.result
+    job = result.job
+    events = result.events
+    stages = {}
+    cache = {}
+    if events is not None:
+        stages['queue'] = result.queue_seconds
+        classes = {nid: node['class_type'] for nid, node in job.workflow['prompt'].items()}
+        for node_id, seconds in events.node_seconds.items():
+            stage = NODE_STAGES.get(classes.get(node_id), 'other_nodes')
+            stages[stage] = stages.get(stage, 0.0) + seconds
+        # ComfyUI execution cache, from the execution_cached event; only
+        # nodes this job owns (see chain.split_result) are counted
+        owned = set(events.node_seconds) | set(events.cached_nodes)
+        encodes = {n for n in owned if NODE_STAGES.get(classes.get(n)) == 'text_encode'}
+        cache = {
+            'nodes': len(owned),
+            'cached': len(set(events.cached_nodes)),
+            'text_encodes': len(encodes),
+            'cached_text_encodes': len(encodes & set(events.cached_nodes)),
+        }
+    if result.prompt_id:
+        stages['download'] = result.download_seconds
+    stages.update(done.stages or {})
+    if result.submitted_at:
+        stages['end_to_end'] = done.done_at - result.submitted_at
+
+    return {
+        'key': job.key,
+        'dst': str(job.dst),
+        'status': 'ok' if done.ok else 'failed',
+        'source': 'gpu' if result.prompt_id else 'raw_cache',
+        'prompt_id': result.prompt_id,
+        'backend': result.backend,
+        'models': [list(sig) for sig in model_signature(job.workflow)],
+        'candidates': len(done.scores) if done.scores else 1,
+        'chain': job.chain,
+        'submitted_at': result.submitted_at,
+        'started_at': events.started_at if events is not None else 0.0,
+        'executed_at': events.finished_at if events is not None else 0.0,
+        'finished_at': result.finished_at,
+        'done_at': done.done_at,
+        'stages': {k: round(v, 4) for k, v in stages.items()},
+        'bytes': done.size,
+        'matting': done.matting,
+        'unchanged': done.unchanged,
+        'error': done.error or result.error,
+        'node_cache': cache,
+        'zombie_seconds': round(result.zombie_seconds, 3),
+    }
+
+
+class RunMetrics:
+    """Collects job records, streaming them to a JSON-lines file as they arrive."""
+
+    def __init__(self, path: Path = None):
+        self.path = Path(path) if path else None
+        self.records = []
+        self._fh = None
+        if self.path:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fh = open(self.path, 'a', encoding='utf-8')
+
+    def add(self, record: dict):
+        self.records.append(record)
+        if self._fh:
+            self._fh.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._fh.flush()
+
+    def close(self):
+        if self._fh:
+            self._fh.close()
+            self._fh = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def summary(self) -> dict:
+        ok = [r for r in self.records if r['status'] == 'ok']
+        by_stage = {}
+        for r in ok:
+            for stage, seconds in r['stages'].items():
+                by_stage.setdefault(stage, []).append(seconds)
+        order = {name: i for i, name in enumerate(STAGE_ORDER)}
+        stages = {
+            stage: {'n': len(v), 'p50': percentile(v, 50), 'p95': percentile(v, 95), 'total': sum(v)}
+            for stage, v in sorted(by_stage.items(), key=lambda kv: order.get(kv[0], len(order)))
+        }
+        gpu = [r for r in ok if r['source'] == 'gpu']
+        backends, per_backend = {}, {}
+        for r in gpu:
+            # chained levels share one prompt: count its execution once
+            backends.setdefault(r['backend'], {})[r['prompt_id']] = (r['started_at'], r['executed_at'])
+            per_backend[r['backend']] = per_backend.get(r['backend'], 0) + 1
+        cache = {}
+        for r in gpu:
+            for name, n in r.get('node_cache', {}).items():
+                cache[name] = cache.get(name, 0) + n
+        # GPU time burnt on prompts that were interrupted; chained levels share one prompt
+        zombies = {r['prompt_id'] or r['key']: r.get('zombie_seconds', 0.0)
+                   for r in self.records if r.get('zombie_seconds')}
+        # utilisation over all servers: busy time against each one's own span
+        busy = span = 0.0
+        gaps = []
+        for intervals in backends.values():
+            b, s, g = gpu_gaps(list(intervals.values()))
+            busy, span, gaps = busy + b, span + s, gaps + g
+        return {
+            'jobs': len(self.records),
+            'ok': len(ok),
+            'stages': stages,
+            'gpu_busy': busy,
+            'gpu_span': span,
+            'gpu_utilisation': busy / span if span else 0.0,
+            'idle_total': sum(gaps),
+            'idle_max': max(gaps, default=0.0),
+            # files kept because the new render looked the same were not rewritten
+            'bytes_written': sum(r['bytes'] for r in ok if not r.get('unchanged')),
+            'backends': per_backend,
+            'node_cache': cache,
+            'node_cache_hit_rate': cache['cached'] / cache['nodes'] if cache.get('nodes') else 0.0,
+            'zombie_prompts': len(zombies),
+            'zombie_gpu_seconds': sum(zombies.values()),
+        }
+
+    def print_summary(self):
+        s = self.summary()
+        if not s['stages']:
+            return
+        print(f"{'stage':<12} {'n':>4} {'p50':>8} {'p95':>8} {'total':>9}")
+        for stage, p in s['stages'].items():
+            print(f"{stage:<12} {p['n']:>4} {p['p50']:8.3f} {p['p95']:8.3f} {p['total']:9.1f}")
+        if s['gpu_span']:
+            print(f"GPU utilisation ~{s['gpu_utilisation'] * 100:.0f}% "
+                  f"(idle {s['idle_total']:.1f}s, longest gap {s['idle_max']:.1f}s)")
+        cache = s['node_cache']
+        if cache.get('nodes'):
+            print(f"ComfyUI cache: {cache['cached']}/{cache['nodes']} nodes reused "
+                  f"({s['node_cache_hit_rate'] * 100:.0f}%), text encodes "
+                  f"{cache['cached_text_encodes']}/{cache['text_encodes']}")
+        if s['zombie_prompts']:
+            print(f"Zombie GPU time: {s['zombie_gpu_seconds']:.1f}s on {s['zombie_prompts']} interrupted prompt(s)")
+        if len(s['backends']) > 1:
+            print("Backends: " + ", ".join(f"{url} {n}" for url, n in s['backends'].items()))
+        print(f"Bytes written: {s['bytes_written'] / 1024:.0f}KB")
+        if self.path:
+            print(f"Metrics: {self.path}")
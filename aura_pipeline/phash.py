@@ -0,0 +1,265 @@
+"""
+Perceptual-hash index of the published images.
+Every output gets a 64-bit dHash (brightness gradients on a 9x8 grid), a
+pHash (signs of the low 8x8 DCT terms of a 32x32 thumbnail) and a colour
+signature (mean RGB of a 4x4 grid, since both hashes only see brightness
+and a recoloured image would pass for the same), all taken on the image
+composited over white, computed for a whole stack of images at once. The index lives next to the generation cache and is keyed by output
+path; files are only re-read when their size or mtime changed, so checking
+hundreds of outputs is a stat() each. It answers two questions a byte
+hash can't:
+
+  - did a regenerated image actually change? If it looks the same as the
+    published one (made with the same post-processing settings), the
+    worker keeps the old file instead of re-encoding it, so nothing needs
+    re-reviewing or re-shipping;
+  - did two evolution levels of one aura come out nearly the same?
+
+    python -m aura_pipeline.phash [public/] [--index .gen_cache/phash.json]
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from .fileio import atomic_write
+
+INDEX_NAME = "phash.json"
+
+HASH_SIZE = 8
+PHASH_SIZE = 32
+# Hamming distances out of 64 bits. At or below UNCHANGED_DISTANCE (both
+# hashes) a regenerated image counts as the same picture; at or below
+# DUPLICATE_DISTANCE (pHash) two levels of one aura are near-duplicates.
+UNCHANGED_DISTANCE = 4
+DUPLICATE_DISTANCE = 10
+# Cells per side of the colour signature, and how far (0-255) any cell's
+# mean R, G or B may move for a regenerated image to count as the same
+COLOR_GRID = 4
+COLOR_TOLERANCE = 16
+# PNG decoding releases the GIL, so files are read on a few threads
+READ_THREADS = min(8, os.cpu_count() or 1)
+
+_LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def _area_matrix(n_out: int, n_in: int) -> np.ndarray:
+    """(n_out, n_in) weights averaging n_out equal spans of n_in samples."""
+    edges = np.linspace(0, n_in, n_out + 1)
+    idx = np.arange(n_in)
+    overlap = np.clip(np.minimum(edges[1:, None], idx + 1) - np.maximum(edges[:-1, None], idx), 0, None)
+    return (overlap / overlap.sum(axis=1, keepdims=True)).astype(np.float32)
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k, i = np.meshgrid(np.arange(n), np.arange(n), indexing='ij')
+    dct = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+    dct[0] /= np.sqrt(2.0)
+    return dct.astype(np.float32)
+
+
+_ROWS = _area_matrix(HASH_SIZE, PHASH_SIZE)
+_COLS = _area_matrix(HASH_SIZE + 1, PHASH_SIZE)
+_GRID = _area_matrix(COLOR_GRID, PHASH_SIZE)
+_DCT = _dct_matrix(PHASH_SIZE)
+
+
+def thumbnail(img) -> np.ndarray:
+    """(PHASH_SIZE, PHASH_SIZE, 3) RGB of `img` composited over white."""
+    from PIL import Image
+    px = np.asarray(img.convert('RGBA').resize((PHASH_SIZE, PHASH_SIZE), Image.BOX), dtype=np.float32)
+    alpha = px[..., 3:] / 255.0
+    return px[..., :3] * alpha + 255.0 * (1.0 - alpha)
+
+
+def _pack(bits: np.ndarray) -> np.ndarray:
+    return np.packbits(bits.reshape(len(bits), -1), axis=1).view('>u8').ravel().astype(np.uint64)
+
+
+def hash_thumbnails(thumbs: np.ndarray) -> tuple:
+    """
+    (dhash, phash) uint64 arrays and (N, COLOR_GRID^2 * 3) uint8 colour
+    signatures for an (N, PHASH_SIZE, PHASH_SIZE, 3) stack.
+    """
+    if not len(thumbs):
+        return np.zeros(0, np.uint64), np.zeros(0, np.uint64), np.zeros((0, COLOR_GRID ** 2 * 3), np.uint8)
+    luma = thumbs @ _LUMA
+    small = _ROWS @ luma @ _COLS.T
+    dct = _DCT @ luma @ _DCT.T
+    low = dct[:, :HASH_SIZE, :HASH_SIZE].reshape(len(thumbs), -1)
+    color = np.einsum('ij,njkc,lk->nilc', _GRID, thumbs, _GRID).reshape(len(thumbs), -1)
+    # the DC term only tracks overall brightness, so it stays out of the median
+    return (_pack(small[:, :, 1:] > small[:, :, :-1]),
+            _pack(low > np.median(low[:, 1:], axis=1, keepdims=True)),
+            np.clip(np.rint(color), 0, 255).astype(np.uint8))
+
+
+def _hex(values: np.ndarray) -> list:
+    return [f"{int(v):016x}" for v in values]
+
+
+def _digests(dhash: np.ndarray, phash: np.ndarray, color: np.ndarray) -> list:
+    return [{'dhash': d, 'phash': p, 'color': c.tobytes().hex()}
+            for d, p, c in zip(_hex(dhash), _hex(phash), color)]
+
+
+def image_hashes(img) -> dict:
+    """{'dhash', 'phash', 'color'} hex digests of one PIL image."""
+    return _digests(*hash_thumbnails(thumbnail(img)[None]))[0]
+
+
+def _file_thumbnail(path) -> np.ndarray:
+    from PIL import Image
+    with Image.open(path) as img:
+        return thumbnail(img)
+
+
+def file_hashes(paths: list) -> list:
+    """image_hashes() of every file, decoded on READ_THREADS threads and hashed as one stack."""
+    with ThreadPoolExecutor(READ_THREADS) as pool:
+        thumbs = list(pool.map(_file_thumbnail, paths))
+    return _digests(*hash_thumbnails(np.stack(thumbs) if thumbs else np.zeros((0, PHASH_SIZE, PHASH_SIZE, 3))))
+
+
+def _popcount(x: np.ndarray) -> np.ndarray:
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(x)
+    return np.unpackbits(x[..., None].view(np.uint8), axis=-1).sum(axis=-1)
+
+
+def distances(a: list, b: list) -> np.ndarray:
+    """Pairwise Hamming distances between two lists of hex digests."""
+    a = np.array([int(h, 16) for h in a], dtype=np.uint64)
+    b = np.array([int(h, 16) for h in b], dtype=np.uint64)
+    return _popcount(a[:, None] ^ b[None, :]).astype(int)
+
+
+def color_distance(a: str, b: str) -> int:
+    """Largest per-cell, per-channel difference between two colour signatures."""
+    a = np.frombuffer(bytes.fromhex(a), np.uint8).astype(int)
+    b = np.frombuffer(bytes.fromhex(b), np.uint8).astype(int)
+    return int(np.abs(a - b).max()) if len(a) == len(b) else 255
+
+
+def same_image(a: dict, b: dict) -> bool:
+    """
+    Whether two image_hashes() describe the same picture: same brightness
+    structure and the same colours. Entries indexed before the colour
+    signature existed never match.
+    """
+    if not (a.get('color') and b.get('color')) or color_distance(a['color'], b['color']) > COLOR_TOLERANCE:
+        return False
+    return all(distances([a[name]], [b[name]])[0, 0] <= UNCHANGED_DISTANCE for name in ('dhash', 'phash'))
+
+
+def near_duplicates(groups: dict) -> list:
+    """
+    (group, level, level, pHash distance) for every pair of levels in a
+    group ({name: {level: hashes}}) at or below DUPLICATE_DISTANCE.
+    """
+    found = []
+    for name, levels in groups.items():
+        order = sorted(levels)
+        matrix = distances([levels[lv]['phash'] for lv in order], [levels[lv]['phash'] for lv in order])
+        for i, j in zip(*np.triu_indices(len(order), 1)):
+            if matrix[i, j] <= DUPLICATE_DISTANCE:
+                found.append((name, order[i], order[j], int(matrix[i, j])))
+    return found
+
+
+class PerceptualIndex:
+    """Output path -> {dhash, phash, color, size, mtime, post, changed_at}, persisted as JSON."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        try:
+            self.entries = json.loads(self.path.read_text(encoding='utf-8')).get('images', {})
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get(self, path, post: str = None) -> dict:
+        """The indexed hashes of `path`; with `post`, only if they were made with those settings."""
+        entry = self.entries.get(str(path))
+        if entry is None or (post is not None and entry.get('post') != post):
+            return None
+        return entry
+
+    def update(self, path, hashes: dict, post: str = None) -> bool:
+        """
+        Record `path` as it is on disk now; returns whether it looks
+        different from before. Without `post` (settings unknown, e.g. a
+        file edited by hand) the old settings carry over only if it looks
+        the same.
+        """
+        path = Path(path)
+        stat = path.stat()
+        old = self.entries.get(str(path))
+        changed = old is None or not same_image(old, hashes)
+        self.entries[str(path)] = {
+            'dhash': hashes['dhash'],
+            'phash': hashes['phash'],
+            'color': hashes.get('color', ''),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+            'post': post if post is not None or changed else old.get('post'),
+            'changed_at': time.time() if changed else old.get('changed_at', 0.0),
+        }
+        return changed
+
+    def refresh(self, paths: list) -> list:
+        """Re-hash the files whose size or mtime moved since they were indexed; returns those that changed."""
+        stale = []
+        for path in paths:
+            try:
+                stat = Path(path).stat()
+            except OSError:
+                continue
+            entry = self.entries.get(str(path))
+            if entry is None or (entry['size'], entry['mtime']) != (stat.st_size, stat.st_mtime_ns):
+                stale.append(path)
+        return [path for path, hashes in zip(stale, file_hashes(stale)) if self.update(path, hashes)]
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {'version': 1, 'images': dict(sorted(self.entries.items()))}
+        atomic_write(self.path, json.dumps(data, indent=1).encode('utf-8'))
+
+
+def main():
+    from .cache import DEFAULT_CACHE_DIR
+    from .hashed import is_hashed_copy
+    public = Path(__file__).resolve().parent.parent / "public"
+    parser = argparse.ArgumentParser(description="Update the perceptual-hash index of the published images "
+                                                 "and report visual changes and near-duplicate levels.")
+    parser.add_argument('roots', nargs='*', type=Path, default=[public])
+    parser.add_argument('--index', type=Path, default=DEFAULT_CACHE_DIR / INDEX_NAME)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = PerceptualIndex(args.index)
+    # web renditions (lv0@256.png) and hashed copies are derived from their original, skip them
+    paths = [p for root in args.roots for p in sorted(root.rglob('*.png'))
+             if '@' not in p.name and not is_hashed_copy(p)]
+    changed = index.refresh(paths)
+    groups = {}
+    for path in paths:
+        if (match := re.fullmatch(r'lv(\d+)\.png', path.name)) and str(path) in index.entries:
+            groups.setdefault(str(path.parent), {})[int(match.group(1))] = index.entries[str(path)]
+    duplicates = near_duplicates(groups)
+    index.save()
+    for path in changed:
+        print(f"changed   {path}")
+    for name, a, b, dist in duplicates:
+        print(f"near-dup  {name}: lv{a} ~ lv{b} (pHash distance {dist})")
+    print(f"{len(paths)} image(s), {len(changed)} visually changed, {len(duplicates)} near-duplicate level pair(s) "
+          f"in {time.perf_counter() - start:.2f}s; index {args.index}")
+
+
+if __name__ == '__main__':
+    main()
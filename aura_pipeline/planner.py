@@ -0,0 +1,160 @@
+"""
+Dry-run planning: how long will this run take, and what bounds it?
+estimate() prices a cache plan with the per-stage timings earlier runs
+wrote to <cache dir>/runs/*.jsonl (see metrics.py), preferring records from
+the same backend and model files, then the same models on any backend,
+then anything. The GPU, download and CPU post-processing stages overlap in
+the pipeline, so the run takes about as long as the slowest of them (the
+critical path) plus one image's trip through the others.
+"""
+
+import json
+import math
+from pathlib import Path
+
+from .backends import DEFAULT_IMAGE_SECONDS
+from .metrics import percentile
+from .workflow import batch_size, model_signature
+
+# How many of the newest run files to learn from
+HISTORY_RUNS = 20
+
+GPU_STAGES = ('text_encode', 'sample', 'vae_decode', 'save_output', 'other_nodes')
+POST_STAGES = ('resize', 'matting', 'score', 'phash', 'png_encode', 'renditions', 'webp_encode', 'avif_encode')
+# Without history: a CPU rembg pass on a 512 px image, roughly
+DEFAULT_POST_SECONDS = 1.5
+
+
+def load_history(runs_dir: Path, runs: int = HISTORY_RUNS) -> list:
+    """Successful job records from the newest `runs` metrics files."""
+    records = []
+    for path in sorted(Path(runs_dir).glob('*.jsonl'))[-runs:]:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get('status') == 'ok':
+                    records.append(record)
+    return records
+
+
+def _stage_sum(record: dict, names: tuple) -> float:
+    return sum(record['stages'].get(name, 0.0) for name in names)
+
+
+def _median(values: list, default: float) -> float:
+    return percentile(values, 50) if values else default
+
+
+class TimingModel:
+    """Median per-image seconds by (backend, models, chained, candidates), with fallbacks."""
+
+    def __init__(self, records: list):
+        self.records = records
+        self.gpu = [r for r in records if r.get('source') == 'gpu' and _stage_sum(r, GPU_STAGES) > 0]
+        self._cache = {}
+
+    def gpu_seconds(self, backend: str, models: list, chained: bool, candidates: int) -> tuple:
+        """(seconds per image, how it was matched: 'backend', 'models', 'any' or 'default')."""
+        key = (backend, json.dumps(models), chained, candidates)
+        if key not in self._cache:
+            tiers = [
+                ('backend', lambda r: r['backend'] == backend and r['models'] == models),
+                ('models', lambda r: r['models'] == models),
+                ('any', lambda r: True),
+            ]
+            found = (DEFAULT_IMAGE_SECONDS, 'default')
+            for name, match in tiers:
+                same = [r for r in self.gpu if match(r)]
+                # prefer the same chain mode and batch size within a tier
+                exact = [r for r in same if bool(r.get('chain')) == chained and r.get('candidates', 1) == candidates]
+                pool = exact or same
+                if pool:
+                    found = (_median([_stage_sum(r, GPU_STAGES) for r in pool], 0.0), name)
+                    break
+            self._cache[key] = found
+        return self._cache[key]
+
+    def model_load(self) -> float:
+        return _median([r['stages']['model_load'] for r in self.gpu if 'model_load' in r['stages']], 0.0)
+
+    def download(self) -> float:
+        return _median([r['stages']['download'] for r in self.gpu if 'download' in r['stages']], 0.0)
+
+    def post(self) -> float:
+        return _median([_stage_sum(r, POST_STAGES) for r in self.records if _stage_sum(r, POST_STAGES) > 0],
+                       DEFAULT_POST_SECONDS)
+
+
+def estimate(plan, generate: list, backends: list, workers: int, records: list) -> dict:
+    """Price a CachePlan; `generate` is plan.generate after chain grouping."""
+    model = TimingModel(records)
+    backends = backends or ['']
+    gpu_images = 0
+    gpu_total = 0.0
+    matched = {}
+    for job in generate:
+        for level in job.meta.get('levels') or [job]:
+            candidates = batch_size(level.workflow)
+            per_backend = [model.gpu_seconds(b, [list(s) for s in model_signature(level.workflow)],
+                                             bool(level.chain), candidates) for b in backends]
+            gpu_total += sum(s for s, _ in per_backend) / len(per_backend)
+            for _, how in per_backend:
+                matched[how] = matched.get(how, 0) + 1
+            gpu_images += 1
+
+    post_images = gpu_images + len(plan.raw)
+    per_gpu = gpu_total / gpu_images if gpu_images else 0.0
+    per_post = model.post()
+    stages = {
+        'gpu': gpu_total / len(backends) + (model.model_load() if gpu_images else 0.0),
+        'download': gpu_images * model.download(),
+        'cpu': post_images * per_post / max(1, workers),
+    }
+    critical = max(stages, key=stages.get)
+    # pipeline fill and drain: the first image's GPU time and the last one's post-processing
+    wall = stages[critical] + (per_gpu if critical != 'gpu' else 0.0) + (per_post if post_images else 0.0)
+    return {
+        'records': len(records),
+        'matched': matched,
+        'gpu_images': gpu_images,
+        'post_images': post_images,
+        'gpu_per_image': per_gpu,
+        'post_per_image': per_post,
+        'download_per_image': model.download(),
+        'model_load': model.model_load(),
+        'stages': stages,
+        'critical': critical,
+        'wall_seconds': wall,
+        # workers that keep the CPU stage no slower than the GPU stage
+        'workers_for_gpu': math.ceil(per_post * len(backends) / per_gpu) if per_gpu else 0,
+        'backends': len(backends),
+        'workers': max(1, workers),
+    }
+
+
+def _duration(seconds: float) -> str:
+    if seconds < 60:
+        return f"{seconds:.0f}s"
+    minutes, seconds = divmod(round(seconds), 60)
+    return f"{minutes // 60}h {minutes % 60:02d}m" if minutes >= 60 else f"{minutes}m {seconds:02d}s"
+
+
+def print_estimate(e: dict):
+    sources = ", ".join(f"{n} by {how}" for how, n in sorted(e['matched'].items()))
+    print(f"Estimate from {e['records']} earlier job record(s)" + (f" ({sources})" if sources else ""))
+    stages = e['stages']
+    print(f"  GPU       {e['gpu_images']:>4} image(s) x {e['gpu_per_image']:.1f}s on {e['backends']} backend(s)"
+          f" + {e['model_load']:.0f}s model load = {_duration(stages['gpu'])}")
+    print(f"  download  {e['gpu_images']:>4} image(s) x {e['download_per_image']:.2f}s"
+          f" = {_duration(stages['download'])}")
+    print(f"  CPU post  {e['post_images']:>4} image(s) x {e['post_per_image']:.1f}s on {e['workers']} worker(s)"
+          f" = {_duration(stages['cpu'])}")
+    print(f"Critical path: {e['critical']}; estimated wall time ~{_duration(e['wall_seconds'])}")
+    if e['critical'] == 'cpu' and e['workers_for_gpu'] > e['workers']:
+        print(f"  --workers {e['workers_for_gpu']} would let post-processing keep up with the GPU")
+    elif e['critical'] == 'gpu' and e['gpu_images'] > 1:
+        more = e['backends'] + 1
+        print(f"  another backend would cut the GPU stage to ~{_duration(stages['gpu'] * e['backends'] / more)}")
@@ -0,0 +1,378 @@
+"""
+CPU post-processing stage: LANCZOS resize, background removal (a NumPy
+white key with rembg as the fallback, see matting.py) and PNG encode
+(palette-quantised by default, see encode.py; plus optional WebP/AVIF and
+size variants, see variants.py), run in a process pool so ComfyUI keeps
+sampling the next jobs while finished images are being cleaned up.
+Each worker builds one rembg session at start-up and warms it on a dummy
+image, so the ONNX model load overlaps the first ComfyUI job instead of
+landing on the first image. With --matting rembg that happens before the
+worker takes any image; with 'auto' it runs on a background thread, so
+images the white key handles don't wait for it. A session that fails to
+load is rebuilt once when an image first needs it; if that fails too, the
+images that need rembg fail instead of rembg quietly building a throwaway
+session for each one.
+"""
+
+import importlib.util
+import io
+import os
+import signal
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+
+from .encode import save_png
+from .fileio import atomic_write
+from .matting import DEFAULT_MATTING, remove_background
+from .metrics import stage_timer
+from .phash import image_hashes, same_image
+from .variants import RENDITION_SIZES, variant_name, write_variants
+
+DEFAULT_WORKERS = 2
+
+# --matting-model choice -> rembg session name. Rough footprint of the ONNX
+# file: u2net 176 MB, u2netp 4.7 MB, isnet 179 MB, silueta 43 MB.
+MATTING_MODELS = {
+    'u2net': 'u2net',
+    'u2netp': 'u2netp',
+    'isnet': 'isnet-general-use',
+    'silueta': 'silueta',
+}
+DEFAULT_MATTING_MODEL = 'u2net'
+
+# per-worker-process rembg session, created by _init_worker (or its warm-up thread)
+_session = None
+_session_info = {}
+_warming = None
+# model left to retry if the first load fails, and why the last load failed
+_session_model = None
+_session_error = ''
+
+
+def rss_mb() -> float:
+    """Resident set size of this process in MB, or None if it can't be read (Windows without psutil)."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2**20
+    except ImportError:
+        pass
+    try:
+        import resource
+        # ru_maxrss is KB on Linux (peak, which is what caps a worker anyway)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        return None
+
+
+def _max_mb(values) -> str:
+    """The largest of some rss_mb() readings as text, 'n/a' if none could be taken."""
+    values = [v for v in values if v is not None]
+    return f"~{max(values):.0f}MB" if values else "n/a"
+
+
+def new_session(model: str = DEFAULT_MATTING_MODEL):
+    """Create and warm a rembg session; returns None if rembg is missing."""
+    try:
+        from PIL import Image
+        from rembg import new_session as rembg_session, remove
+    except ImportError:
+        return None
+    session = rembg_session(MATTING_MODELS.get(model, model))
+    remove(Image.new('RGB', (64, 64), 'white'), session=session)
+    return session
+
+
+def _load_session(model: str):
+    """Build this worker's session and record its load time and memory in _session_info."""
+    global _session, _session_error
+    before = rss_mb()
+    start = time.perf_counter()
+    try:
+        _session, _session_error = new_session(model), ''
+    except Exception as e:
+        _session, _session_error = None, f"{type(e).__name__}: {e}"
+        print(f"rembg {model} session failed to load in worker {os.getpid()}: {_session_error}")
+    after = rss_mb()
+    _session_info.update(
+        model=model if _session is not None else None,
+        load_seconds=time.perf_counter() - start,
+        rss_mb=after,
+        model_mb=after - before if after is not None and before is not None else None,
+    )
+
+
+def _lazy_session():
+    """This worker's rembg session, once the warm-up thread has finished building it."""
+    global _session_model
+    if _warming is not None:
+        _warming.join()
+    if _session is None and _session_error and _session_model:
+        model, _session_model = _session_model, None
+        print(f"rembg {model}: retrying the session load in worker {os.getpid()}")
+        _load_session(model)
+    if _session is None and _session_error:
+        raise RuntimeError(f"no rembg session ({_session_error})")
+    return _session
+
+
+def _init_worker(model: str, matting: str = 'rembg'):
+    global _session_info, _session_model, _warming
+    # Ctrl-C is the parent's to handle: it drains the queue through these workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _session_info = {'pid': os.getpid(), 'model': None}
+    _session_model = model
+    if matting == 'rembg':
+        _load_session(model)
+    elif matting == 'auto' and importlib.util.find_spec('rembg') is not None:
+        _warming = threading.Thread(target=_load_session, args=(model,), daemon=True)
+        _warming.start()
+
+
+def _worker_info() -> dict:
+    return _session_info
+
+
+def _published(dst: str, variants: list) -> bool:
+    """Whether dst, and its renditions if they are wanted, are already on disk."""
+    dst = Path(dst)
+    return dst.exists() and (variants is None or dst.with_name(variant_name(dst, RENDITION_SIZES[-1])).exists())
+
+
+def _save(img, dst: str, timings: dict, variants: list, encoding: dict, hashes: dict, previous: dict):
+    """
+    Write `img` and its renditions, unless it looks the same as `previous`
+    (the published file's phash entry) and that file is still there.
+    `hashes` receives the image's perceptual hashes and 'unchanged'.
+    """
+    if hashes is not None:
+        with stage_timer(timings, 'phash'):
+            hashes.update(image_hashes(img))
+        hashes['unchanged'] = bool(previous) and same_image(previous, hashes) and _published(dst, variants)
+        if hashes['unchanged']:
+            return
+    with stage_timer(timings, 'png_encode'):
+        save_png(img, dst, **encoding)
+    if variants is not None:
+        variants.extend(write_variants(img, dst, timings, encoding=encoding))
+
+
+def process_image(data: bytes, dst: str, w: int, h: int, session=None, timings: dict = None,
+                  variants: list = None, encoding: dict = None, matting: str = DEFAULT_MATTING,
+                  hashes: dict = None, previous: dict = None) -> str:
+    """
+    Resize, remove the background and save. Returns how the background was
+    removed ('key' or 'rembg'), or '' if PIL is missing and the raw image
+    was written as it is.
+    If `variants` is a list, the web renditions are written too and described in it.
+    `encoding` is passed to encode.save_png (encoder, dither). See _save()
+    for `hashes` and `previous`.
+    """
+    encoding = encoding or {}
+    timings = {} if timings is None else timings
+    try:
+        from PIL import Image
+    except ImportError:
+        atomic_write(dst, data)
+        return ''
+    with stage_timer(timings, 'resize'):
+        img = Image.open(io.BytesIO(data))
+        img = img.resize((w, h), Image.LANCZOS)
+    # Remove background -> transparent PNG
+    with stage_timer(timings, 'matting'):
+        img, method = remove_background(img, matting, session)
+    _save(img, dst, timings, variants, encoding, hashes, previous)
+    return method
+
+
+def process_candidates(images: list, dst: str, w: int, h: int, session=None, timings: dict = None,
+                       variants: list = None, encoding: dict = None, matting: str = DEFAULT_MATTING,
+                       hashes: dict = None, previous: dict = None) -> tuple:
+    """
+    Matte every batch candidate, score the stack and save the best one.
+    Returns (matting method of the winner, winning index, scores).
+    """
+    timings = {} if timings is None else timings
+    try:
+        import numpy as np
+        from PIL import Image
+        from .scoring import score_candidates
+    except ImportError:
+        return process_image(images[0], dst, w, h, session, timings, variants, encoding, matting,
+                             hashes, previous), 0, []
+    with stage_timer(timings, 'resize'):
+        resized = [Image.open(io.BytesIO(data)).resize((w, h), Image.LANCZOS) for data in images]
+    with stage_timer(timings, 'matting'):
+        matted, methods = zip(*(remove_background(img, matting, session) for img in resized))
+    with stage_timer(timings, 'score'):
+        alphas = np.stack([np.asarray(img.convert('RGBA'))[..., 3] for img in matted]).astype(np.float32) / 255
+        scores, _ = score_candidates(alphas)
+        best = int(scores.argmax())
+    _save(matted[best], dst, timings, variants, encoding or {}, hashes, previous)
+    return methods[best], best, [round(float(x), 3) for x in scores]
+
+
+def _process_task(images: list, dst: str, w: int, h: int, variants: bool = False,
+                  encoding: dict = None, matting: str = DEFAULT_MATTING, previous: dict = None) -> tuple:
+    start = time.perf_counter()
+    timings = {}
+    written = [] if variants else None
+    hashes = {}
+    if len(images) > 1:
+        method, pick, scores = process_candidates(images, dst, w, h, _lazy_session, timings, written,
+                                                  encoding, matting, hashes, previous)
+    else:
+        method = process_image(images[0], dst, w, h, _lazy_session, timings, written, encoding, matting,
+                               hashes, previous)
+        pick, scores = 0, []
+    # the session may have been built since the warm-up reported on this worker
+    return method, pick, scores, time.perf_counter() - start, timings, written, hashes, dict(_session_info)
+
+
+@dataclass
+class Processed:
+    result: object  # engine.JobResult
+    bg_removed: bool = False
+    # 'key' (NumPy white key), 'rembg', or '' when the raw image was kept
+    matting: str = ''
+    size: int = 0
+    seconds: float = 0.0
+    # index of the kept batch candidate and every candidate's score
+    pick: int = 0
+    scores: list = None
+    # per-stage seconds inside the worker (resize, matting, score, png_encode)
+    stages: dict = None
+    # variants.write_variants() entries when web renditions were requested
+    variants: list = None
+    # perceptual hashes of the image (phash.image_hashes); empty for raw writes
+    phash: dict = None
+    # it looked the same as the published file, which was kept as it was
+    unchanged: bool = False
+    done_at: float = 0.0
+    error: str = ''
+
+    @property
+    def ok(self) -> bool:
+        return not self.error
+
+
+class PostProcessor:
+    """
+    Process pool fed through a bounded queue: submit() blocks once
+    `queue_size` images are waiting, which keeps memory flat if the CPU
+    stage falls behind the GPU.
+    """
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, queue_size: int = None,
+                 model: str = DEFAULT_MATTING_MODEL, variants: bool = False, encoding: dict = None,
+                 matting: str = DEFAULT_MATTING):
+        self.workers = max(1, workers)
+        self.model = model
+        self.matting = matting
+        self.variants = variants
+        self.encoding = encoding or {}
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                         initargs=(model, matting))
+        # start every worker now so the rembg model loads while ComfyUI samples
+        self._warmup = [self._pool.submit(_worker_info) for _ in range(self.workers)]
+        # pid -> the latest _session_info a worker sent back with an image
+        self._sessions = {}
+        self._slots = threading.BoundedSemaphore(queue_size or self.workers * 2)
+        self._futures = []
+        self.cpu_seconds = 0.0
+        self.count = 0
+        # images per matting method
+        self.methods = {}
+        self.bytes_written = 0
+        self.started_at = time.time()
+        self.last_done_at = 0.0
+
+    def submit(self, result, previous: dict = None):
+        """Queue a result for post-processing; `previous` is the published file's phash entry, if any."""
+        self._slots.acquire()
+        w, h = result.job.size
+        result.job.dst.parent.mkdir(parents=True, exist_ok=True)
+        future = self._pool.submit(_process_task, result.images, str(result.job.dst), w, h,
+                                   self.variants, self.encoding, self.matting, previous)
+        future.add_done_callback(lambda _: self._slots.release())
+        # the bytes now live in the worker; don't keep a second copy around
+        result.images = None
+        self._futures.append((future, result))
+
+    def _collect(self, future, result) -> Processed:
+        done = Processed(result, done_at=time.time())
+        try:
+            (done.matting, done.pick, done.scores, done.seconds, done.stages, done.variants,
+             hashes, session) = future.result()
+            self._sessions[session.get('pid')] = session
+            done.unchanged = hashes.pop('unchanged', False)
+            done.phash = hashes
+            done.bg_removed = bool(done.matting)
+            done.size = os.path.getsize(result.job.dst)
+        except Exception as e:
+            done.error = str(e) or type(e).__name__
+            return done
+        self.cpu_seconds += done.seconds
+        self.count += 1
+        self.methods[done.matting] = self.methods.get(done.matting, 0) + 1
+        if not done.unchanged:
+            self.bytes_written += done.size
+        self.last_done_at = time.time()
+        return done
+
+    def completed(self):
+        """Yield whatever has finished so far without blocking."""
+        still_running = []
+        for future, result in self._futures:
+            if future.done():
+                yield self._collect(future, result)
+            else:
+                still_running.append((future, result))
+        self._futures = still_running
+
+    def drain(self):
+        """Wait for every outstanding image, yielding them as they finish."""
+        while self._futures:
+            wait([f for f, _ in self._futures], return_when=FIRST_COMPLETED)
+            yield from self.completed()
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def session_stats(self) -> list:
+        """Per-worker rembg load time and memory, as last reported by each worker."""
+        stats = {}
+        for future in self._warmup:
+            if future.done() and not future.exception():
+                info = future.result()
+                stats[info.get('pid')] = info
+        stats.update(self._sessions)
+        return list(stats.values())
+
+    def print_summary(self, gpu_count: int, gpu_seconds: float):
+        """Compare GPU-stage and CPU-stage throughput for the run."""
+        sessions = [info for info in self.session_stats() if info.get('model')]
+        if sessions:
+            load = sum(info['load_seconds'] for info in sessions) / len(sessions)
+            rss = _max_mb(info['rss_mb'] for info in sessions)
+            model_mb = _max_mb(info['model_mb'] for info in sessions)
+            print(f"rembg {self.model}: {len(sessions)} session(s), {load:.1f}s load+warm, "
+                  f"{rss} RSS per worker ({model_mb} for the model)")
+        if gpu_count and gpu_seconds > 0:
+            print(f"GPU stage: {gpu_count} images in {gpu_seconds:.1f}s "
+                  f"({gpu_count / gpu_seconds * 60:.1f} img/min)")
+        if self.count:
+            per_image = self.cpu_seconds / self.count
+            capacity = self.workers / per_image * 60 if per_image else 0
+            print(f"CPU stage: {self.count} images, {per_image:.2f}s each on "
+                  f"{self.workers} worker(s) ({capacity:.1f} img/min capacity)")
+            names = {'key': "white key", 'rembg': "rembg", '': "not matted"}
+            print("Matting: " + ", ".join(f"{n} {names.get(m, m)}" for m, n in sorted(self.methods.items())))
@@ -0,0 +1,63 @@
+"""
+Generation order: the images the app shows first are rendered first.
+A full run used to walk aura 1..20 x lv0..4, so the lv0 images the
+encyclopedia and the partner cards need were spread over the whole run.
+With the 'level' order every lv0 is generated before any lv1, and so on;
+--hot puts the listed auras ahead of everything. Each image is written to
+its public/ path by the post-processing worker as soon as it is done, so
+the app is usable once the first tier has finished.
+"""
+
+PRIORITY_ORDERS = ('level', 'manifest')
+DEFAULT_PRIORITY = 'level'
+
+
+def job_priority(job, order: str = DEFAULT_PRIORITY, hot=()) -> tuple:
+    """
+    Sort key, smallest first: hot auras, then (with 'level') by level, jobs
+    without a level after the levelled ones. Ties keep manifest order.
+    """
+    cold = bool(hot) and job.aura not in hot
+    if order != 'level':
+        return (cold, False, 0)
+    return (cold, job.level is None, job.level or 0)
+
+
+def _tier_name(key: tuple, order: str, hot) -> str:
+    cold, unlevelled, level = key
+    parts = ["hot"] if hot and not cold else []
+    if order == 'level':
+        parts.append("other" if unlevelled else f"lv{level}")
+    return " ".join(parts) or ("rest" if hot else "all")
+
+
+def priority_tiers(jobs: list, order: str = DEFAULT_PRIORITY, hot=()) -> list:
+    """[(tier name, jobs)] in generation order."""
+    tiers = {}
+    for job in jobs:
+        tiers.setdefault(job_priority(job, order, hot), []).append(job)
+    return [(_tier_name(key, order, hot), tiers[key]) for key in sorted(tiers)]
+
+
+class TierProgress:
+    """Reports when every image of a priority tier has been published."""
+
+    def __init__(self, tiers: list, started: float):
+        self.started = started
+        self.tiers = [(name, len(jobs)) for name, jobs in tiers]
+        self._remaining = {name: {job.key for job in jobs} for name, jobs in tiers}
+        self._tier_of = {job.key: name for name, jobs in tiers for job in jobs}
+        # tier name -> seconds from the start of the run to its last image
+        self.finished = {}
+
+    def done(self, job, at: float) -> str:
+        """Mark `job` finished (published or failed); returns its tier's name if that completed it."""
+        name = self._tier_of.get(job.key)
+        remaining = self._remaining.get(name)
+        if remaining is None or job.key not in remaining:
+            return ''
+        remaining.discard(job.key)
+        if remaining:
+            return ''
+        self.finished[name] = at - self.started
+        return name
@@ -0,0 +1,340 @@
+"""
+One generation session over a declarative job manifest.
+The generate_*.py scripts only produce Job lists; run_jobs() does the
+connection check, cache planning, pipelined submission, post-processing and
+the final report once for all of them, so generate_all.py can render every
+asset without reconnecting or reloading models between passes.
+"""
+
+import contextlib
+import json
+import signal
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from . import engine
+from .comfy_http import client
+from .atlas import build_level_atlases, stale_atlases
+from .cache import DEFAULT_CACHE_DIR, GenerationCache
+from .chain import chain_jobs, split_result
+from .hashed import publish_hashed
+from .journal import JOURNAL_NAME, Journal
+from .phash import INDEX_NAME as PHASH_INDEX, PerceptualIndex, near_duplicates
+from .engine import Job, JobResult, check_connection, describe_failure, pick_record, run_pipeline
+from .metrics import RunMetrics, job_record
+from .planner import estimate, load_history, print_estimate
+from .postprocess import PostProcessor, Processed
+from .priority import TierProgress, priority_tiers
+from .variants import record_variants
+from .workflow import canonicalize, conditioning_key, model_signature
+
+
+def order_for_residency(jobs: list) -> list:
+    """
+    Group jobs by the UNet/CLIP/VAE files they load (first-seen order), so
+    ComfyUI never has to swap models mid-run, and within a group put jobs
+    with the same text prompts back to back so their encodes come from
+    ComfyUI's cache. Otherwise the order is kept.
+    """
+    groups = {}
+    for job in jobs:
+        by_text = groups.setdefault(model_signature(job.workflow), {})
+        by_text.setdefault(conditioning_key(job.workflow), []).append(job)
+    return [job for group in groups.values() for same_text in group.values() for job in same_text]
+
+
+def save_manifest(jobs: list, path: Path):
+    manifest = [{
+        'key': job.key,
+        'label': job.label,
+        'dst': str(job.dst),
+        'size': list(job.size),
+        'timeout': job.timeout,
+        'chain': job.chain,
+        'aura': job.aura,
+        'level': job.level,
+        'workflow': job.workflow,
+    } for job in jobs]
+    Path(path).write_text(json.dumps(manifest, ensure_ascii=False, indent=1), encoding='utf-8')
+
+
+def load_manifest(path: Path) -> list:
+    manifest = json.loads(Path(path).read_text(encoding='utf-8'))
+    return [Job(key=item['key'], label=item['label'], workflow=item['workflow'], dst=Path(item['dst']),
+                size=tuple(item.get('size', (512, 512))), timeout=item.get('timeout', 300),
+                chain=item.get('chain', ''), aura=item.get('aura'), level=item.get('level'))
+            for item in manifest]
+
+
+@dataclass
+class RunSummary:
+    success: int = 0
+    fail: int = 0
+    skipped: int = 0
+    generated: int = 0
+    gpu_seconds: float = 0.0
+    wall_seconds: float = 0.0
+    # postprocess.Processed for every image that went through this run
+    processed: list = field(default_factory=list)
+    metrics: dict = field(default_factory=dict)
+    # HTTPClient counters for this run (connections, requests, reused, errors, seconds)
+    http: dict = field(default_factory=dict)
+    # planner.estimate() result for --plan runs
+    estimate: dict = field(default_factory=dict)
+    # stopped early by Ctrl-C
+    interrupted: bool = False
+    # priority tier name -> seconds from the start until its last image was done
+    tiers: dict = field(default_factory=dict)
+    # regenerated images that looked the same as the published ones, which were kept
+    unchanged: int = 0
+    # (group, level, level, pHash distance) of near-identical evolution levels
+    duplicates: list = field(default_factory=list)
+
+
+@contextlib.contextmanager
+def graceful_interrupt():
+    """
+    Yields an Event the first Ctrl-C sets instead of raising, so the run can
+    cancel its queued prompts and drain what is already running; a second
+    Ctrl-C raises KeyboardInterrupt as usual.
+    """
+    stop = threading.Event()
+    if threading.current_thread() is not threading.main_thread():
+        yield stop
+        return
+
+    def handler(signum, frame):
+        if stop.is_set():
+            raise KeyboardInterrupt
+        stop.set()
+        print("\nInterrupted: cancelling queued prompts, finishing running ones (Ctrl-C again to abort)")
+
+    previous = signal.signal(signal.SIGINT, handler)
+    try:
+        yield stop
+    finally:
+        signal.signal(signal.SIGINT, previous)
+
+
+def plan_only(plan, generate: list, backends: list, args, runs_dir: Path) -> RunSummary:
+    """The --plan report: what each job would need and how long the run should take."""
+    if args.variants:
+        plan.raw, plan.restore = plan.restore + plan.raw, []
+    for job in plan.changed:
+        print(f"{job.label} - changed since the last run")
+    for status, jobs in (('skip', plan.fresh), ('restore from cache', plan.restore),
+                         ('post-process cached raw image', plan.raw), ('generate', plan.generate)):
+        for job in jobs:
+            print(f"{job.label} - {status}")
+    chains = sum(1 for job in generate if job.meta.get('levels'))
+    print(f"\nPlan: {len(plan.fresh)} skip, {len(plan.restore)} restore, {len(plan.raw)} post-process only, "
+          f"{len(plan.generate)} generate" + (f" in {len(generate)} prompt(s), {chains} chain(s)" if chains else ""))
+    summary = RunSummary(skipped=len(plan.fresh) + len(plan.restore))
+    summary.estimate = estimate(plan, generate, backends, args.workers, load_history(runs_dir))
+    print_estimate(summary.estimate)
+    return summary
+
+
+def run_jobs(jobs: list, args, title: str) -> RunSummary:
+    """Generate every job in one session; returns None if ComfyUI is unreachable."""
+    for job in jobs:
+        job.workflow = canonicalize(job.workflow)
+    # priority tiers first; model residency and prompt grouping within each
+    tiers = [(name, order_for_residency(tier)) for name, tier in priority_tiers(jobs, args.priority, args.hot)]
+    jobs = [job for _, tier in tiers for job in tier]
+    started = time.time()
+    http_before = client.stats()
+
+    print("=" * 60)
+    print(title)
+    print(f"Jobs: {len(jobs)}")
+    print("=" * 60)
+
+    if args.plan:
+        # nothing is submitted, so don't require the servers to be up
+        backends = [url.rstrip('/') for url in args.backends or [engine.COMFYUI_URL]]
+    elif args.backends:
+        backends = [url.rstrip('/') for url in args.backends if check_connection(url.rstrip('/'))]
+    else:
+        backends = [engine.COMFYUI_URL] if check_connection() else []
+    if not backends:
+        return None
+    print()
+
+    summary = RunSummary()
+
+    encoding = {'encoder': args.encoder, 'dither': args.dither}
+    # only key the cache on options that differ from the original optimize=True
+    # PNG output, so entries from before these options existed stay valid
+    post_params = {'model': args.matting_model}
+    if args.matting != 'rembg':
+        post_params['matting'] = args.matting
+    if args.variants:
+        post_params['variants'] = True
+    if args.encoder != 'optimize':
+        post_params.update(encoding)
+    cache = GenerationCache(args.cache_dir, enabled=args.use_cache, **post_params)
+    manifests = {}
+    runs_dir = Path(args.cache_dir or DEFAULT_CACHE_DIR) / "runs"
+    plan = cache.plan(jobs, track=not args.plan)
+    generate = chain_jobs(plan.generate)
+    if args.plan:
+        return plan_only(plan, generate, backends, args, runs_dir)
+    metrics_path = args.metrics or runs_dir / time.strftime("%Y%m%d-%H%M%S.jsonl")
+    if args.variants:
+        # the cache keeps only the final PNG; rebuild the renditions from the raw image
+        plan.raw = plan.restore + plan.raw
+        plan.restore = []
+    for job in plan.changed:
+        print(f"{job.label} - changed since the last run")
+    for job in plan.fresh:
+        print(f"{job.label} - skip")
+    for job in plan.restore:
+        cache.restore(job)
+        print(f"{job.label} - restored from cache")
+    summary.skipped = summary.success = len(plan.fresh) + len(plan.restore)
+    phash_index = PerceptualIndex(cache.root / PHASH_INDEX)
+    # outputs replaced outside this pipeline since the last run
+    known = set(phash_index.entries) - {str(job.dst) for job in plan.restore}
+    for path in phash_index.refresh([job.dst for job in jobs]):
+        if str(path) in known:
+            print(f"{path} - looks different since the last run")
+    progress = TierProgress(tiers, started)
+    for job in plan.fresh + plan.restore:
+        progress.done(job, started)
+    if plan.changed or plan.fresh:
+        print(f"{len(plan.changed)} job(s) changed since the last run, {len(plan.fresh)} unchanged")
+
+    def settled(job):
+        tier = progress.done(job, time.time())
+        if tier and len(tiers) > 1:
+            print(f"-- {tier} tier finished {progress.finished[tier]:.0f}s into the run")
+
+    def previous(job):
+        return None if args.rewrite_unchanged else phash_index.get(job.dst, cache.post_signature(job))
+
+    def report(done):
+        summary.processed.append(done)
+        metrics.add(job_record(done))
+        label = done.result.job.label
+        if not done.ok:
+            print(f"{label} FAIL(p) {done.error}")
+            journal.record(done.result.job, 'failed', error=done.error)
+            settled(done.result.job)
+            return False
+        journal.record(done.result.job, 'done')
+        if done.unchanged:
+            # dst is still the older render: caching it (or its hashes) under this
+            # workflow would serve that render for this workflow from now on
+            summary.unchanged += 1
+            print(f"{label} OK (looks unchanged, kept the published file)")
+            settled(done.result.job)
+            return True
+        cache.store_output(done.result.job, **pick_record(done))
+        if done.phash:
+            phash_index.update(done.result.job.dst, done.phash, cache.post_signature(done.result.job))
+        if done.variants:
+            # keep assets.json current, so finished assets are usable mid-run
+            record_variants(manifests, done.result.job.dst, done.variants).save()
+        pick = f", pick {done.pick + 1}/{len(done.scores)}" if done.scores else ""
+        source = f"{done.result.run_seconds:.1f}s gpu" if done.result.prompt_id else "from raw cache"
+        print(f"{label} OK ({done.size / 1024:.0f}KB, {source}, {done.seconds:.1f}s post{pick})")
+        settled(done.result.job)
+        return True
+
+    # the cache index, metrics and journal are closed on the way out, interrupted or not
+    with graceful_interrupt() as stop, cache, RunMetrics(metrics_path) as metrics, \
+            Journal(cache.root / JOURNAL_NAME) as journal, \
+            PostProcessor(workers=args.workers, model=args.matting_model, variants=args.variants,
+                          encoding=encoding, matting=args.matting) as post:
+        attach = journal.attachable(generate)
+        for job in plan.raw:
+            post.submit(JobResult(job=job, images=cache.load_raw(job)), previous(job))
+
+        if attach:
+            print(f"Re-attaching to {len(attach)} prompt(s) left by an interrupted run")
+        gen_started = time.time()
+        pipeline = run_pipeline(generate, window=args.window, use_ws=args.use_ws, backends=backends,
+                                attach=attach, on_submit=journal.submitted, retries=args.retries,
+                                reseed=args.reseed, stop=stop)
+        # closing: a second Ctrl-C still cancels what is left on the servers
+        with contextlib.closing(pipeline):
+            for chained in pipeline:
+                if chained.job.meta.get('levels'):
+                    journal.record(chained.job, 'done' if chained.ok else 'failed', error=chained.error)
+                for result in split_result(chained):
+                    if not result.ok:
+                        print(f"{result.job.label} FAIL({result.error[0]}) {describe_failure(result)}")
+                        journal.record(result.job, 'failed', error=result.error)
+                        settled(result.job)
+                        metrics.add(job_record(Processed(result, done_at=time.time(), error=result.error)))
+                        summary.fail += 1
+                        continue
+                    summary.generated += 1
+                    cache.store_raw(result.job, result.images)
+                    journal.record(result.job, 'generated')
+                    post.submit(result, previous(result.job))
+                for done in post.completed():
+                    if report(done):
+                        summary.success += 1
+                    else:
+                        summary.fail += 1
+        summary.gpu_seconds = time.time() - gen_started
+
+        for done in post.drain():
+            if report(done):
+                summary.success += 1
+            else:
+                summary.fail += 1
+        summary.interrupted = stop.is_set()
+
+    if args.atlas or args.atlas_grid:
+        changed = {d.result.job.dst for d in summary.processed if d.ok and not d.unchanged}
+        changed |= {job.dst for job in plan.restore}
+        directories, roots = stale_atlases(jobs, changed, grid=args.atlas_grid)
+        atlases = build_level_atlases(directories if args.atlas else [], roots,
+                                      variants=args.variants, encoding=encoding)
+        if atlases:
+            print(f"Atlases: rebuilt {len(atlases)}")
+
+    if args.hashed:
+        for manifest in publish_hashed(jobs):
+            count = sum(len(names) for names in manifest.assets.values())
+            print(f"Hashed assets: {count} listed in {manifest.path}")
+
+    groups = {}
+    for job in jobs:
+        entry = phash_index.get(job.dst)
+        if job.level is not None and entry is not None:
+            name = f"aura {job.aura}" if job.aura is not None else job.dst.parent.name
+            groups.setdefault(name, {})[job.level] = entry
+    summary.duplicates = near_duplicates(groups)
+    phash_index.save()
+
+    summary.wall_seconds = time.time() - started
+    for manifest in manifests.values():
+        manifest.save()
+        print(f"Variants: {len(manifest.assets)} assets listed in {manifest.path}")
+    summary.metrics = metrics.summary()
+    summary.http = http = client.stats(since=http_before)
+    summary.tiers = dict(progress.finished)
+    print(f"\n{'=' * 60}")
+    post.print_summary(summary.generated, summary.gpu_seconds)
+    metrics.print_summary()
+    if http['requests']:
+        print(f"HTTP: {http['requests']} requests over {http['connections']} connection(s), "
+              f"{http['seconds'] / http['requests'] * 1000:.1f}ms avg")
+    if summary.unchanged:
+        print(f"Unchanged: {summary.unchanged} regenerated image(s) looked the same and were not rewritten")
+    if summary.duplicates:
+        print("Near-duplicate levels: " + ", ".join(f"{name} lv{a}~lv{b} ({dist}/64)"
+                                                    for name, a, b, dist in summary.duplicates))
+    if len(tiers) > 1 and summary.tiers:
+        print("Tiers finished: " + ", ".join(f"{name} {seconds:.0f}s" for name, seconds in summary.tiers.items())
+              + f" of {summary.wall_seconds:.0f}s")
+    print(f"{'INTERRUPTED' if summary.interrupted else 'DONE'}: {summary.success}/{len(jobs)}, "
+          f"{summary.fail} failed")
+    print("=" * 60)
+    return summary
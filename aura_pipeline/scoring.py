@@ -0,0 +1,67 @@
+"""
+Cheap CPU scoring for multi-candidate generation.
+Every metric is computed on the whole (K, H, W) alpha stack at once, so
+picking the best of K matted candidates costs a few milliseconds.
+"""
+
+import numpy as np
+
+# What a well-framed 512x512 mascot looks like after matting
+TARGET_COVERAGE = 0.30
+TARGET_BBOX_FILL = 0.55
+
+WEIGHTS = {
+    'coverage': 1.0,
+    'centroid': 2.0,
+    'bbox_fill': 1.0,
+    'clipped': 1.5,
+    'residue': 3.0,
+}
+
+
+def candidate_metrics(alphas: np.ndarray) -> dict:
+    """Vectorised per-candidate metrics for a (K, H, W) alpha stack in [0, 1]."""
+    k, h, w = alphas.shape
+    solid = alphas > 0.5
+    coverage = solid.mean(axis=(1, 2))
+
+    mass = alphas.sum(axis=(1, 2)) + 1e-6
+    ys = np.arange(h, dtype=np.float32)
+    xs = np.arange(w, dtype=np.float32)
+    cy = (alphas.sum(axis=2) * ys).sum(axis=1) / mass
+    cx = (alphas.sum(axis=1) * xs).sum(axis=1) / mass
+    centroid = np.hypot(cy / h - 0.5, cx / w - 0.5) / np.hypot(0.5, 0.5)
+
+    rows = solid.any(axis=2)
+    cols = solid.any(axis=1)
+    has = rows.any(axis=1)
+    top = np.where(has, rows.argmax(axis=1), 0)
+    bottom = np.where(has, h - rows[:, ::-1].argmax(axis=1), 0)
+    left = np.where(has, cols.argmax(axis=1), 0)
+    right = np.where(has, w - cols[:, ::-1].argmax(axis=1), 0)
+    bbox_fill = (bottom - top) * (right - left) / float(h * w)
+    clipped = ((top == 0) | (left == 0) | (bottom == h) | (right == w)) & has
+
+    # semi-transparent haze the matting left behind, outside the solid subject
+    residue = ((alphas > 0.05) & ~solid).mean(axis=(1, 2))
+
+    return {
+        'coverage': coverage,
+        'centroid': centroid,
+        'bbox_fill': bbox_fill,
+        'clipped': clipped.astype(np.float32),
+        'residue': residue,
+    }
+
+
+def score_candidates(alphas: np.ndarray) -> tuple:
+    """Return (scores, metrics); higher is better, 0 is perfect."""
+    m = candidate_metrics(alphas)
+    penalty = (
+        WEIGHTS['coverage'] * np.abs(m['coverage'] - TARGET_COVERAGE) / TARGET_COVERAGE
+        + WEIGHTS['centroid'] * m['centroid']
+        + WEIGHTS['bbox_fill'] * np.abs(m['bbox_fill'] - TARGET_BBOX_FILL) / TARGET_BBOX_FILL
+        + WEIGHTS['clipped'] * m['clipped']
+        + WEIGHTS['residue'] * m['residue'] / max(TARGET_COVERAGE, 1e-6)
+    )
+    return -penalty, m
@@ -0,0 +1,127 @@
+"""
+Web renditions of each finished asset.
+From the matted image already in memory, the post-processing worker writes
+alpha-preserving WebP/AVIF copies and a 256/128 px ladder next to the PNG
+(lv0.png -> lv0.webp, lv0.avif, lv0@256.png, lv0@256.webp, ...). An
+assets.json at the web root lists, per original PNG, every file with its
+type, dimensions and bytes, cheapest first, so the app can take the first
+entry its browser decodes that is at least as wide as the slot it fills.
+"""
+
+import json
+from pathlib import Path
+
+from .encode import save_png
+from .fileio import atomic_path, atomic_write
+from .metrics import stage_timer
+
+# Smaller renditions, largest first so each is resized from the previous one
+RENDITION_SIZES = (256, 128)
+
+# format -> Pillow save options; both keep the alpha channel
+VARIANT_FORMATS = {
+    'webp': {'quality': 85, 'alpha_quality': 90, 'method': 4},
+    'avif': {'quality': 60, 'speed': 6},
+}
+
+MIME_TYPES = {'png': 'image/png', 'webp': 'image/webp', 'avif': 'image/avif'}
+
+MANIFEST_NAME = "assets.json"
+
+
+def available_formats() -> list:
+    """The VARIANT_FORMATS this Pillow build can encode."""
+    from PIL import features
+    return [fmt for fmt in VARIANT_FORMATS if features.check(fmt)]
+
+
+def variant_name(dst: Path, size: int = None, fmt: str = 'png') -> str:
+    suffix = f"@{size}" if size else ""
+    return f"{dst.stem}{suffix}.{fmt}"
+
+
+def write_variants(img, dst, timings: dict = None, sizes: tuple = RENDITION_SIZES,
+                   encoding: dict = None) -> list:
+    """
+    Write the format/size variants of `img` (the image saved as `dst`).
+    Returns {file, type, width, height, bytes} for each, `dst` included,
+    with `file` relative to dst's directory.
+    """
+    from PIL import Image
+    timings = {} if timings is None else timings
+    dst = Path(dst)
+    formats = available_formats()
+    entries = []
+
+    def add(path: Path, fmt: str, image):
+        entries.append({
+            'file': path.name,
+            'type': MIME_TYPES[fmt],
+            'width': image.width,
+            'height': image.height,
+            'bytes': path.stat().st_size,
+        })
+
+    add(dst, 'png', img)
+    current = img
+    for size in (None,) + tuple(sizes):
+        if size:
+            if size >= current.width:
+                continue
+            with stage_timer(timings, 'renditions'):
+                current = current.resize((size, round(current.height * size / current.width)), Image.LANCZOS)
+                path = dst.with_name(variant_name(dst, size))
+                save_png(current, path, **(encoding or {}))
+            add(path, 'png', current)
+        for fmt in formats:
+            path = dst.with_name(variant_name(dst, size, fmt))
+            with stage_timer(timings, f'{fmt}_encode'), atomic_path(path) as tmp:
+                current.save(tmp, fmt.upper(), **VARIANT_FORMATS[fmt])
+            add(path, fmt, current)
+    return entries
+
+
+def manifest_location(dst: Path) -> tuple:
+    """
+    (manifest path, web path of dst). The web root is the nearest `public`
+    directory above dst, or dst's own directory if there is none.
+    """
+    dst = Path(dst)
+    parts = dst.parts
+    if 'public' in parts[:-1]:
+        i = len(parts) - 1 - parts[::-1].index('public')
+        root = Path(*parts[:i + 1])
+    else:
+        root = dst.parent
+    return root / MANIFEST_NAME, '/' + dst.relative_to(root).as_posix()
+
+
+class VariantManifest:
+    """assets.json: original web path -> its variants, cheapest first."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        try:
+            self.assets = json.loads(self.path.read_text(encoding='utf-8')).get('assets', {})
+        except (OSError, ValueError):
+            self.assets = {}
+
+    def add(self, web_path: str, entries: list):
+        base = web_path.rsplit('/', 1)[0]
+        variants = [dict({k: v for k, v in entry.items() if k != 'file'}, src=f"{base}/{entry['file']}")
+                    for entry in entries]
+        self.assets[web_path] = sorted(variants, key=lambda e: e['bytes'])
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {'version': 1, 'assets': dict(sorted(self.assets.items()))}
+        atomic_write(self.path, json.dumps(data, indent=1).encode('utf-8'))
+
+
+def record_variants(manifests: dict, dst: Path, entries: list) -> VariantManifest:
+    """Add one asset's variants to the right manifest in `manifests` (path -> VariantManifest) and return it."""
+    path, web_path = manifest_location(dst)
+    if path not in manifests:
+        manifests[path] = VariantManifest(path)
+    manifests[path].add(web_path, entries)
+    return manifests[path]
@@ -0,0 +1,245 @@
+"""
+The Flux Schnell GGUF txt2img graph every generator submits.
+Scripts only supply prompts, seed and output prefix.
+chain_workflows() builds the img2img variant for evolution levels, where
+each level is sampled from the previous level's latent inside one graph.
+canonicalize() makes the nodes every job shares (model loaders, the
+empty negative prompt, the empty latent) bit-identical across jobs, so
+ComfyUI's execution cache reuses them from one prompt to the next.
+"""
+
+import copy
+import json
+
+UNET = "flux1-schnell-Q4_K_S.gguf"
+CLIP_L = "clip_l.safetensors"
+T5XXL = "t5-v1_1-xxl-encoder-Q4_K_M.gguf"
+VAE = "ae.safetensors"
+
+WIDTH = 512
+HEIGHT = 512
+STEPS = 4
+# Share of the schedule a chained level re-noises and samples again
+CHAIN_DENOISE = 0.6
+
+
+def flux_workflow(clip_l: str, t5xxl: str, seed: int, prefix: str,
+                  width: int = WIDTH, height: int = HEIGHT, steps: int = STEPS) -> dict:
+    """Build ComfyUI txt2img workflow for Flux Schnell GGUF."""
+    return {
+        "prompt": {
+            "1": {
+                "class_type": "UnetLoaderGGUF",
+                "inputs": {"unet_name": UNET}
+            },
+            "2": {
+                "class_type": "DualCLIPLoaderGGUF",
+                "inputs": {
+                    "clip_name1": CLIP_L,
+                    "clip_name2": T5XXL,
+                    "type": "flux"
+                }
+            },
+            "3": {
+                "class_type": "CLIPTextEncodeFlux",
+                "inputs": {
+                    "clip": ["2", 0],
+                    "clip_l": clip_l,
+                    "t5xxl": t5xxl,
+                    "guidance": 3.5
+                }
+            },
+            "4": {
+                "class_type": "CLIPTextEncodeFlux",
+                "inputs": {
+                    "clip": ["2", 0],
+                    "clip_l": "",
+                    "t5xxl": "",
+                    "guidance": 3.5
+                }
+            },
+            "5": {
+                "class_type": "EmptyLatentImage",
+                "inputs": {"width": width, "height": height, "batch_size": 1}
+            },
+            "6": {
+                "class_type": "KSampler",
+                "inputs": {
+                    "model": ["1", 0],
+                    "seed": seed,
+                    "steps": steps,
+                    "cfg": 1.0,
+                    "sampler_name": "euler",
+                    "scheduler": "simple",
+                    "positive": ["3", 0],
+                    "negative": ["4", 0],
+                    "latent_image": ["5", 0],
+                    "denoise": 1.0
+                }
+            },
+            "7": {
+                "class_type": "VAELoader",
+                "inputs": {"vae_name": VAE}
+            },
+            "8": {
+                "class_type": "VAEDecode",
+                "inputs": {"samples": ["6", 0], "vae": ["7", 0]}
+            },
+            "9": {
+                "class_type": "SaveImage",
+                "inputs": {"images": ["8", 0], "filename_prefix": prefix}
+            }
+        }
+    }
+
+
+def chain_workflows(levels: list, denoise: float = CHAIN_DENOISE, width: int = WIDTH,
+                    height: int = HEIGHT, steps: int = STEPS) -> list:
+    """
+    img2img evolution chain. `levels` is [(clip_l, t5xxl, seed, prefix)].
+    Level 0 is sampled from an empty latent; level n re-noises level n-1's
+    latent to `denoise` and samples only the last steps*denoise steps of the
+    schedule with its own prompt, so forms carry over and later levels cost
+    a fraction of a full run. The latent never leaves ComfyUI.
+    Returns one workflow per level: level n's graph holds the samplers of
+    levels 0..n but decodes and saves only level n, so its cache key covers
+    everything it depends on. merge_workflows() joins them into one prompt.
+    """
+    shared = flux_workflow("", "", 0, "", width, height, steps)['prompt']
+    shared = {node_id: shared[node_id] for node_id in ("1", "2", "4", "5", "7")}
+    chain_steps = max(1, round(steps * denoise))
+    samplers = {}
+    workflows = []
+    for n, (clip_l, t5xxl, seed, prefix) in enumerate(levels):
+        samplers[f"lv{n}.encode"] = {
+            "class_type": "CLIPTextEncodeFlux",
+            "inputs": {"clip": ["2", 0], "clip_l": clip_l, "t5xxl": t5xxl, "guidance": 3.5}
+        }
+        samplers[f"lv{n}.sample"] = {
+            "class_type": "KSampler",
+            "inputs": {
+                "model": ["1", 0],
+                "seed": seed,
+                "steps": steps if n == 0 else chain_steps,
+                "cfg": 1.0,
+                "sampler_name": "euler",
+                "scheduler": "simple",
+                "positive": [f"lv{n}.encode", 0],
+                "negative": ["4", 0],
+                "latent_image": ["5", 0] if n == 0 else [f"lv{n - 1}.sample", 0],
+                "denoise": 1.0 if n == 0 else denoise
+            }
+        }
+        prompt = dict(shared, **samplers)
+        prompt[f"lv{n}.decode"] = {
+            "class_type": "VAEDecode",
+            "inputs": {"samples": [f"lv{n}.sample", 0], "vae": ["7", 0]}
+        }
+        prompt[f"lv{n}.save"] = {
+            "class_type": "SaveImage",
+            "inputs": {"images": [f"lv{n}.decode", 0], "filename_prefix": prefix}
+        }
+        workflows.append(copy.deepcopy({"prompt": prompt}))
+    return workflows
+
+
+def merge_workflows(workflows: list) -> dict:
+    """One prompt running every graph in `workflows`; nodes with the same id must be identical."""
+    prompt = {}
+    for workflow in workflows:
+        prompt.update(workflow['prompt'])
+    return {"prompt": prompt}
+
+
+# Shared nodes -> the id flux_workflow() gives them; ComfyUI versions that
+# cache by node id only reuse an output if the id matches too
+CANONICAL_IDS = {
+    'UnetLoaderGGUF': "1",
+    'DualCLIPLoaderGGUF': "2",
+    'EmptyTextEncode': "4",
+    'EmptyLatentImage': "5",
+    'VAELoader': "7",
+}
+
+FLOAT_INPUTS = {'cfg', 'guidance', 'denoise'}
+INT_INPUTS = {'seed', 'steps', 'width', 'height', 'batch_size'}
+
+
+def _is_link(value) -> bool:
+    return isinstance(value, list) and len(value) == 2 and isinstance(value[0], str)
+
+
+def _canonical_node(node: dict) -> dict:
+    inputs = {}
+    for name, value in sorted(node.get('inputs', {}).items()):
+        if name in FLOAT_INPUTS and isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = float(value)
+        elif name in INT_INPUTS and isinstance(value, float) and value.is_integer():
+            value = int(value)
+        inputs[name] = value
+    return dict(node, inputs=inputs)
+
+
+def _shared_kind(node: dict) -> str:
+    kind = node['class_type']
+    if kind.startswith('CLIPTextEncode'):
+        texts = [v for v in node['inputs'].values() if isinstance(v, str)]
+        return 'EmptyTextEncode' if not any(t.strip() for t in texts) else None
+    return kind if kind in CANONICAL_IDS else None
+
+
+def canonicalize(workflow: dict) -> dict:
+    """
+    `workflow` with inputs in sorted order, numbers typed the way ComfyUI
+    declares them, and each shared node (when the graph has exactly one of
+    its kind and the id is free) under its CANONICAL_IDS id, links rewritten.
+    flux_workflow() and chain_workflows() graphs come back unchanged.
+    """
+    prompt = {node_id: _canonical_node(node) for node_id, node in workflow['prompt'].items()}
+    kinds = {}
+    for node_id, node in prompt.items():
+        kind = _shared_kind(node)
+        if kind:
+            kinds.setdefault(kind, []).append(node_id)
+    renames = {}
+    for kind, ids in kinds.items():
+        target = CANONICAL_IDS[kind]
+        if len(ids) == 1 and ids[0] != target and target not in prompt:
+            renames[ids[0]] = target
+    if renames:
+        prompt = {renames.get(node_id, node_id): dict(node, inputs={
+            name: [renames.get(value[0], value[0]), value[1]] if _is_link(value) else value
+            for name, value in node['inputs'].items()}) for node_id, node in prompt.items()}
+    return dict(workflow, prompt=prompt)
+
+
+def conditioning_key(workflow: dict) -> str:
+    """The non-empty text prompts a workflow encodes; equal keys share cached text conditioning."""
+    texts = []
+    for node in workflow['prompt'].values():
+        if node['class_type'].startswith('CLIPTextEncode') and not _shared_kind(node):
+            texts.append(json.dumps(node['inputs'], sort_keys=True, ensure_ascii=False))
+    return '\n'.join(sorted(texts))
+
+
+LOADER_INPUTS = {
+    'UnetLoaderGGUF': ('unet_name',),
+    'DualCLIPLoaderGGUF': ('clip_name1', 'clip_name2', 'type'),
+    'VAELoader': ('vae_name',),
+}
+
+
+def batch_size(workflow: dict) -> int:
+    """Images per prompt (batch candidates) a workflow samples."""
+    return max([node['inputs'].get('batch_size', 1) for node in workflow['prompt'].values()
+                if node['class_type'] == 'EmptyLatentImage'] or [1])
+
+
+def model_signature(workflow: dict) -> tuple:
+    """The (unet, clip, vae) files a workflow loads; equal signatures share resident models."""
+    sig = []
+    for node in workflow['prompt'].values():
+        names = LOADER_INPUTS.get(node['class_type'])
+        if names:
+            sig.append((node['class_type'],) + tuple(str(node['inputs'].get(n)) for n in names))
+    return tuple(sorted(sig))
@@ -0,0 +1,142 @@
+"""
+Benchmark the generation pipeline against a local fake ComfyUI server.
+Runs the same run_jobs() loop the generate_*.py scripts use, with simulated
+node delays and synthetic PNGs, so orchestration changes can be measured on
+any machine without a GPU. Reports images/minute, GPU idle gaps and
+per-stage latency percentiles.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import tempfile
+import threading
+from pathlib import Path
+
+import generate_all
+from aura_pipeline.engine import add_pipeline_args
+from aura_pipeline.fake_comfyui import FakeComfyUI, FakeTimings
+from aura_pipeline.metrics import gpu_gaps, percentile
+from aura_pipeline.runner import run_jobs
+
+
+def run_once(args, jobs: list, window: int, use_ws: bool) -> dict:
+    timings = FakeTimings(load=args.load, encode=args.encode, sample=args.sample,
+                          decode=args.decode, jitter=args.jitter)
+    with contextlib.ExitStack() as stack:
+        servers = [stack.enter_context(FakeComfyUI(timings=timings)) for _ in range(args.servers)]
+        tmp = stack.enter_context(tempfile.TemporaryDirectory())
+        if args.kill_after is not None:
+            # simulate the last server dying mid-run
+            killer = threading.Timer(args.kill_after, servers[-1].close)
+            killer.start()
+            stack.callback(killer.cancel)
+        for job in jobs:
+            job.dst = Path(tmp) / "out" / job.dst.parent.name / job.dst.name
+            job.meta.clear()
+        run_args = argparse.Namespace(**vars(args))
+        run_args.window, run_args.use_ws = window, use_ws
+        run_args.backends = [server.url for server in servers]
+        run_args.use_cache, run_args.cache_dir = False, str(Path(tmp) / "cache")
+        run_args.metrics = None
+        with contextlib.redirect_stdout(io.StringIO()):
+            summary = run_jobs(jobs, run_args, "benchmark")
+
+    busy = span = 0.0
+    gaps = []
+    for server in servers:
+        b, s, g = gpu_gaps([(start, end) for _, start, end in server.executions])
+        busy, span, gaps = busy + b, span + s, gaps + g
+    done = [d for d in summary.processed if d.ok]
+    stages = {
+        'queue': [d.result.queue_seconds for d in done],
+        'execute': [d.result.run_seconds for d in done],
+        'download': [d.result.download_seconds for d in done],
+        'post': [d.seconds for d in done],
+        'end_to_end': [d.done_at - d.result.submitted_at for d in done],
+    }
+    return {
+        'window': window,
+        'websocket': use_ws,
+        'servers': len(servers),
+        'images': summary.success,
+        'failed': summary.fail,
+        'per_server': summary.metrics.get('backends', {}),
+        'http': dict(summary.http, accepted=sum(server.connections_accepted for server in servers)),
+        'wall_seconds': summary.wall_seconds,
+        'images_per_minute': summary.success / summary.wall_seconds * 60 if summary.wall_seconds else 0.0,
+        'gpu_utilisation': busy / span if span else 0.0,
+        'node_cache': summary.metrics.get('node_cache', {}),
+        'idle_total': sum(gaps),
+        'idle_max': max(gaps, default=0.0),
+        'stages': {name: {'p50': percentile(v, 50), 'p95': percentile(v, 95), 'max': max(v, default=0.0)}
+                   for name, v in stages.items()},
+    }
+
+
+def print_report(name: str, r: dict):
+    print(f"\n[{name}] window={r['window']} {'ws' if r['websocket'] else 'polling'}, {r['servers']} server(s)")
+    print(f"  {r['images']} images ({r['failed']} failed) in {r['wall_seconds']:.1f}s "
+          f"= {r['images_per_minute']:.1f} img/min")
+    if r['servers'] > 1:
+        print("  per server: " + ", ".join(str(n) for n in r['per_server'].values()))
+    http = r['http']
+    print(f"  HTTP {http['requests']} requests over {http['connections']} client connection(s) "
+          f"({http['accepted']} accepted by the servers, incl. WebSocket)")
+    print(f"  GPU utilisation {r['gpu_utilisation'] * 100:.0f}%, idle {r['idle_total']:.2f}s total, "
+          f"longest gap {r['idle_max']:.2f}s")
+    cache = r['node_cache']
+    if cache.get('nodes'):
+        print(f"  ComfyUI cache {cache['cached']}/{cache['nodes']} nodes reused "
+              f"({cache['cached'] / cache['nodes'] * 100:.0f}%), text encodes "
+              f"{cache['cached_text_encodes']}/{cache['text_encodes']}")
+    print(f"  {'stage':<11} {'p50':>7} {'p95':>7} {'max':>7}")
+    for stage, p in r['stages'].items():
+        print(f"  {stage:<11} {p['p50']:7.3f} {p['p95']:7.3f} {p['max']:7.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_pipeline_args(parser)
+    parser.add_argument('--only', nargs='+', choices=sorted(generate_all.PRODUCERS),
+                        help="benchmark some of the producers (default: all 125 jobs)")
+    parser.add_argument('--limit', type=int, help="only the first N jobs")
+    parser.add_argument('--load', type=float, default=0.5, help="simulated model load seconds (first use)")
+    parser.add_argument('--encode', type=float, default=0.05, help="simulated text encode seconds")
+    parser.add_argument('--sample', type=float, default=0.4, help="simulated sampling seconds per image")
+    parser.add_argument('--decode', type=float, default=0.05, help="simulated VAE decode seconds per image")
+    parser.add_argument('--jitter', type=float, default=0.1, help="+/- fraction of random delay jitter")
+    parser.add_argument('--servers', type=int, default=1, help="number of fake ComfyUI servers to shard over")
+    parser.add_argument('--kill-after', type=float, metavar='SECONDS',
+                        help="close the last server after this long, to exercise re-routing")
+    parser.add_argument('--compare', action='store_true',
+                        help="also run the old submit-then-wait loop (window 1, /history polling)")
+    parser.add_argument('--chain', action='store_true',
+                        help="render aura evolutions as img2img chains, and compare with from-scratch levels")
+    parser.add_argument('--json', metavar='PATH', help="write the results as JSON")
+    args = parser.parse_args()
+
+    jobs = generate_all.build_jobs(args.candidates, args.only, args.chain)[:args.limit]
+    results = {'chain' if args.chain else 'pipelined': run_once(args, jobs, args.window, args.use_ws)}
+    if args.chain:
+        scratch = generate_all.build_jobs(args.candidates, args.only)[:args.limit]
+        results['from_scratch'] = run_once(args, scratch, args.window, args.use_ws)
+    if args.compare:
+        old = argparse.Namespace(**dict(vars(args), servers=1, kill_after=None))
+        results['sequential'] = run_once(old, jobs, 1, False)
+
+    print("=" * 60)
+    print(f"Pipeline benchmark: {len(jobs)} jobs against fake ComfyUI "
+          f"(sample {args.sample}s, decode {args.decode}s, jitter ±{args.jitter * 100:.0f}%)")
+    print("=" * 60)
+    for name, r in results.items():
+        print_report(name, r)
+    if args.chain and results['chain']['wall_seconds']:
+        print(f"\nchain vs from scratch: {results['from_scratch']['wall_seconds'] / results['chain']['wall_seconds']:.2f}x")
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=1), encoding='utf-8')
+
+
+if __name__ == '__main__':
+    main()
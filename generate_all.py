@@ -0,0 +1,55 @@
+"""
+Generate every app asset in one ComfyUI session:
+20 base auras + 5 mascot stages + 100 aura × level images = 125 jobs.
+The three generate_*.py scripts only contribute their job manifests; the
+shared runner orders them so the GGUF UNet, CLIP and VAE stay resident.
+"""
+
+import argparse
+
+import generate_aura_evolutions
+import generate_auras
+import generate_evolution
+from aura_pipeline.engine import add_pipeline_args
+from aura_pipeline.runner import load_manifest, run_jobs, save_manifest
+
+PRODUCERS = {
+    'auras': generate_auras,
+    'evolution': generate_evolution,
+    'aura-evolutions': generate_aura_evolutions,
+}
+
+
+def build_jobs(candidates: int = 1, only=None, chain: bool = False) -> list:
+    jobs = []
+    for name, module in PRODUCERS.items():
+        if only and name not in only:
+            continue
+        if module is generate_aura_evolutions:
+            jobs.extend(module.build_jobs(candidates, chain))
+        else:
+            jobs.extend(module.build_jobs(candidates))
+    return jobs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_pipeline_args(parser)
+    parser.add_argument('--only', nargs='+', choices=sorted(PRODUCERS),
+                        help="limit the session to some of the producers")
+    parser.add_argument('--chain', action='store_true',
+                        help="render each aura's evolution levels as one img2img chain")
+    parser.add_argument('--manifest', help="run the jobs from a manifest JSON instead of the producers")
+    parser.add_argument('--dump-manifest', metavar='PATH', help="write the job manifest as JSON and exit")
+    args = parser.parse_args()
+
+    jobs = load_manifest(args.manifest) if args.manifest else build_jobs(args.candidates, args.only, args.chain)
+    if args.dump_manifest:
+        save_manifest(jobs, args.dump_manifest)
+        print(f"Wrote {len(jobs)} jobs to {args.dump_manifest}")
+        return
+    run_jobs(jobs, args, f"Generating all aura assets via ComfyUI Flux Schnell ({len(jobs)} images)")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,20 +4,14 @@ Style: Same cute round glowing energy spirit "기운이" but at different growth
 Output: aura-spoon/public/evolution/lv0.png ~ lv4.png (512x512px, transparent BG)
 """
 
-import urllib.request
-import json
-import time
-import os
-import shutil
+import argparse
 from pathlib import Path
 
-COMFYUI_URL = "http://127.0.0.1:8188"
-OUTPUT_DIR = Path(r"C:\Users\USER-PC\Desktop\appintoss-project\aura-spoon\public\evolution")
-COMFYUI_OUTPUT = Path(r"C:\Users\USER-PC\Downloads\ComfyUI_windows_portable_nvidia\ComfyUI_windows_portable\ComfyUI\output")
+from aura_pipeline.engine import Job, add_pipeline_args, with_batch_size
+from aura_pipeline.runner import run_jobs
+from aura_pipeline.workflow import flux_workflow
 
-WIDTH = 512
-HEIGHT = 512
-STEPS = 4
+OUTPUT_DIR = Path(r"C:\Users\USER-PC\Desktop\appintoss-project\aura-spoon\public\evolution")
 
 # Base style (matches existing aura spirit art style)
 BASE = (
@@ -132,210 +126,27 @@ def build_workflow(level: int) -> dict:
     """Build ComfyUI txt2img workflow for Flux Schnell GGUF."""
     data = EVOLUTION_DATA[level]
     t5xxl = f"{BASE}, {data['t5xxl']}"
-    prefix = f"evolution_lv{level}"
-
-    return {
-        "prompt": {
-            "1": {
-                "class_type": "UnetLoaderGGUF",
-                "inputs": {"unet_name": "flux1-schnell-Q4_K_S.gguf"}
-            },
-            "2": {
-                "class_type": "DualCLIPLoaderGGUF",
-                "inputs": {
-                    "clip_name1": "clip_l.safetensors",
-                    "clip_name2": "t5-v1_1-xxl-encoder-Q4_K_M.gguf",
-                    "type": "flux"
-                }
-            },
-            "3": {
-                "class_type": "CLIPTextEncodeFlux",
-                "inputs": {
-                    "clip": ["2", 0],
-                    "clip_l": data["clip_l"],
-                    "t5xxl": t5xxl,
-                    "guidance": 3.5
-                }
-            },
-            "4": {
-                "class_type": "CLIPTextEncodeFlux",
-                "inputs": {
-                    "clip": ["2", 0],
-                    "clip_l": "",
-                    "t5xxl": "",
-                    "guidance": 3.5
-                }
-            },
-            "5": {
-                "class_type": "EmptyLatentImage",
-                "inputs": {
-                    "width": WIDTH,
-                    "height": HEIGHT,
-                    "batch_size": 1
-                }
-            },
-            "6": {
-                "class_type": "KSampler",
-                "inputs": {
-                    "model": ["1", 0],
-                    "seed": data["seed"],
-                    "steps": STEPS,
-                    "cfg": 1.0,
-                    "sampler_name": "euler",
-                    "scheduler": "simple",
-                    "positive": ["3", 0],
-                    "negative": ["4", 0],
-                    "latent_image": ["5", 0],
-                    "denoise": 1.0
-                }
-            },
-            "7": {
-                "class_type": "VAELoader",
-                "inputs": {"vae_name": "ae.safetensors"}
-            },
-            "8": {
-                "class_type": "VAEDecode",
-                "inputs": {"samples": ["6", 0], "vae": ["7", 0]}
-            },
-            "9": {
-                "class_type": "SaveImage",
-                "inputs": {"images": ["8", 0], "filename_prefix": prefix}
-            }
-        }
-    }
-
-
-def queue_prompt(workflow: dict) -> str:
-    data = json.dumps(workflow).encode('utf-8')
-    req = urllib.request.Request(
-        f"{COMFYUI_URL}/prompt",
-        data=data,
-        headers={'Content-Type': 'application/json'}
-    )
-    resp = urllib.request.urlopen(req)
-    return json.loads(resp.read())['prompt_id']
-
-
-def wait_for_completion(prompt_id: str, timeout: int = 600) -> dict:
-    start = time.time()
-    while time.time() - start < timeout:
-        try:
-            resp = urllib.request.urlopen(f"{COMFYUI_URL}/history/{prompt_id}")
-            history = json.loads(resp.read())
-            if prompt_id in history:
-                status = history[prompt_id].get('status', {})
-                if status.get('completed', False) or status.get('status_str') == 'success':
-                    return history[prompt_id]
-                if status.get('status_str') == 'error':
-                    print(f"  ERROR: {json.dumps(status, indent=2)[:500]}")
-                    return None
-        except Exception:
-            pass
-        time.sleep(3)
-    print(f"  TIMEOUT after {timeout}s")
-    return None
-
-
-def find_output_file(history: dict) -> str:
-    try:
-        outputs = history.get('outputs', {})
-        for node_id, node_out in outputs.items():
-            if 'images' in node_out:
-                for img in node_out['images']:
-                    return img.get('filename', '')
-    except Exception as e:
-        print(f"  Error parsing output: {e}")
-    return ''
-
-
-def resize_image(src: str, dst: str, w: int, h: int):
-    try:
-        from PIL import Image
-        from rembg import remove
-        img = Image.open(src)
-        img = img.resize((w, h), Image.LANCZOS)
-        # Remove background -> transparent PNG
-        img = remove(img)
-        img.save(dst, 'PNG', optimize=True)
-        return True
-    except ImportError:
-        shutil.copy2(src, dst)
-        return False
+    return flux_workflow(data["clip_l"], t5xxl, data["seed"], prefix=f"evolution_lv{level}")
 
 
-def main():
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-
-    print("=" * 60)
-    print("Generating 5 Evolution Stage images via ComfyUI Flux Schnell")
-    print(f"Resolution: {WIDTH}x{HEIGHT}")
-    print(f"Output: {OUTPUT_DIR}")
-    print("=" * 60)
-
-    # Check ComfyUI connection
-    try:
-        resp = urllib.request.urlopen(f"{COMFYUI_URL}/system_stats")
-        stats = json.loads(resp.read())
-        gpu = stats.get("devices", [{}])[0].get("name", "unknown")
-        print(f"ComfyUI connected: {gpu}")
-    except Exception as e:
-        print(f"ComfyUI not available: {e}")
-        print("Please start ComfyUI first!")
-        return
-
-    success_count = 0
-    fail_count = 0
-
+def build_jobs(candidates: int = 1) -> list:
+    """Job manifest: the 5 mascot stages, written to public/evolution/lv{level}.png."""
+    jobs = []
     for level in range(5):
         data = EVOLUTION_DATA[level]
-        print(f"\n[Lv.{level}] {data['name']} (seed={data['seed']})")
-
-        workflow = build_workflow(level)
-        try:
-            prompt_id = queue_prompt(workflow)
-            print(f"  Queued: {prompt_id}")
-        except Exception as e:
-            print(f"  FAILED to queue: {e}")
-            fail_count += 1
-            continue
+        workflow = with_batch_size(build_workflow(level), candidates)
+        jobs.append(Job(key=f"evolution_lv{level}", label=f"[Lv.{level}] {data['name']} (seed={data['seed']})",
+                        workflow=workflow, dst=OUTPUT_DIR / f"lv{level}.png", level=level))
+    return jobs
 
-        history = wait_for_completion(prompt_id, timeout=300)
-        if not history:
-            fail_count += 1
-            continue
 
-        filename = find_output_file(history)
-        if not filename:
-            print("  No output file found")
-            fail_count += 1
-            continue
-
-        src_path = COMFYUI_OUTPUT / filename
-        dst_path = OUTPUT_DIR / f"lv{level}.png"
-
-        if not src_path.exists():
-            for subdir in COMFYUI_OUTPUT.iterdir():
-                if subdir.is_dir():
-                    candidate = subdir / filename
-                    if candidate.exists():
-                        src_path = candidate
-                        break
-
-        if src_path.exists():
-            resized = resize_image(str(src_path), str(dst_path), WIDTH, HEIGHT)
-            size_kb = os.path.getsize(str(dst_path)) / 1024
-            print(f"  Saved: {dst_path.name} ({size_kb:.0f}KB) {'(bg removed)' if resized else '(copy)'}")
-            success_count += 1
-        else:
-            print(f"  Output file not found: {src_path}")
-            fail_count += 1
-
-    print(f"\n{'=' * 60}")
-    print(f"DONE: {success_count} succeeded, {fail_count} failed")
-    if list(OUTPUT_DIR.glob('*.png')):
-        total_size = sum(f.stat().st_size for f in OUTPUT_DIR.glob('*.png')) / 1024
-        print(f"Total size: {total_size:.0f}KB")
-    print("=" * 60)
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_pipeline_args(parser)
+    args = parser.parse_args()
+    run_jobs(build_jobs(args.candidates), args,
+             f"Generating 5 Evolution Stage images via ComfyUI Flux Schnell\n"
+             f"Output: {OUTPUT_DIR}")
 
 
 if __name__ == '__main__':